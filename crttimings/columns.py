@@ -0,0 +1,174 @@
+"""columns: columnar binary dump of detailed resolutions.
+
+   A dump is a directory holding one NumPy .npy file per field of FIELDS
+   (h_active.npy, h_front.npy...) and per extra field given by the writer
+   (the sweep adds timing and ok), one row per resolution. Integer fields
+   are stored as little endian int64, flags as bool.
+
+   Files are written without NumPy: the .npy header is formatted by hand
+   and padded to HEADER_SIZE bytes, so the row count it holds can be
+   rewritten in place after each chunk of rows is appended. A dump is thus
+   readable at any time while it is written, and can be reopened to append
+   rows after a given count (later rows are dropped).
+
+   load_columns maps the files in memory: with NumPy installed, columns are
+   numpy.memmap arrays (numpy.load(..., mmap_mode='r')), otherwise typed
+   memoryviews. Opening a dump does not read its rows.
+"""
+import array
+import logging
+import mmap
+import os
+import sys
+
+from .crttimings import FIELDS, _get_fields
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# magic, header length and header dict, padded to leave room for any count
+HEADER_SIZE = 128
+
+BOOL_FIELDS = frozenset(('h_polarity', 'v_polarity', 'interlaced', 'native', 'ok'))
+
+# rows buffered before being written
+CHUNK_SIZE = 65536
+
+
+def column_descr(field):
+    return '|b1' if field in BOOL_FIELDS else '<i8'
+
+
+def npy_header(descr, rows):
+    """HEADER_SIZE bytes .npy (version 1.0) header of a 1-D array"""
+    text = "{{'descr': '{}', 'fortran_order': False, 'shape': ({},), }}".format(descr, rows)
+    size = HEADER_SIZE - len(NPY_MAGIC) - 2
+    text = text.ljust(size - 1) + '\n'
+    return NPY_MAGIC + bytes(bytearray((size & 0xff, size >> 8))) + text.encode('latin1')
+
+
+def parse_npy_header(header):
+    """(descr, rows) of a header written by npy_header"""
+    if header[:len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError("Not a version 1.0 .npy file")
+    text = header[len(NPY_MAGIC) + 2:].decode('latin1')
+    descr = text.split("'descr': '", 1)[1].split("'", 1)[0]
+    rows = int(text.split("'shape': (", 1)[1].split(',', 1)[0])
+    return descr, rows
+
+
+def column_path(directory, field):
+    return os.path.join(directory, field + '.npy')
+
+
+def column_itemsize(field):
+    return 1 if field in BOOL_FIELDS else 8
+
+
+class ColumnWriter(object):
+    """Appends resolutions (or TimingSnapshot objects) to a columnar dump,
+       chunk by chunk.
+
+       extra_fields name columns following FIELDS, their values are given
+       to append. With rows, the existing dump is reopened and truncated to
+       that many rows before appending.
+    """
+    def __init__(self, directory, chunk_size=CHUNK_SIZE, extra_fields=(), rows=None):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.fields = FIELDS + tuple(extra_fields)
+        self.rows = rows or 0
+        self.pending = []
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.files = []
+        for field in self.fields:
+            if rows is None:
+                f = open(column_path(directory, field), 'wb')
+            else:
+                f = open(column_path(directory, field), 'r+b')
+                f.truncate(HEADER_SIZE + rows * column_itemsize(field))
+            f.write(npy_header(column_descr(field), self.rows))
+            f.seek(0, os.SEEK_END)
+            self.files.append(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, timing, *extra):
+        self.pending.append(_get_fields(timing) + extra)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, timings):
+        for timing in timings:
+            self.append(timing)
+
+    def flush(self):
+        """Writes the pending rows and the new row count"""
+        if not self.pending:
+            return
+        for field, f, values in zip(self.fields, self.files, zip(*self.pending)):
+            if field in BOOL_FIELDS:
+                data = bytearray(1 if value else 0 for value in values)
+            else:
+                data = array.array('q', (int(value) for value in values))
+                if sys.byteorder == 'big':
+                    data.byteswap()
+            f.write(data)
+        self.rows += len(self.pending)
+        self.pending = []
+        for field, f in zip(self.fields, self.files):
+            f.seek(0)
+            f.write(npy_header(column_descr(field), self.rows))
+            f.seek(0, os.SEEK_END)
+            f.flush()
+        logger.debug("%s rows written to %s", self.rows, self.directory)
+
+    def close(self):
+        if self.files:
+            self.flush()
+            for f in self.files:
+                f.close()
+            self.files = []
+
+
+def dump_columns(timings, directory, chunk_size=CHUNK_SIZE):
+    """Writes a columnar dump of resolutions, returns the row count"""
+    with ColumnWriter(directory, chunk_size) as writer:
+        writer.extend(timings)
+    return writer.rows
+
+
+def map_column(path):
+    """memoryview of a column file mapped in memory, without NumPy"""
+    with open(path, 'rb') as f:
+        descr, rows = parse_npy_header(f.read(HEADER_SIZE))
+        if rows == 0:
+            return memoryview(b'').cast('q' if descr == '<i8' else '?')
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)[HEADER_SIZE:]
+    if descr == '<i8':
+        if sys.byteorder == 'big':
+            raise ValueError("Reading int64 columns without NumPy needs a little endian host")
+        return view[:rows * 8].cast('q')
+    return view[:rows].cast('?')
+
+
+def load_columns(directory, fields=FIELDS):
+    """dict field -> column of a columnar dump, mapped in memory"""
+    if numpy is not None:
+        return dict((field, numpy.load(column_path(directory, field), mmap_mode='r')) for field in fields)
+    return dict((field, map_column(column_path(directory, field))) for field in fields)
+
+
+__all__ = ['ColumnWriter', 'dump_columns', 'load_columns', 'map_column', 'npy_header', 'parse_npy_header']
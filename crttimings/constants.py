@@ -1,9 +1,6 @@
 class Constants(object):
     BLANK = int(-2147483647)
 
-    MIN_TIMING = 0
-    MAX_TIMING = 5
-
     MIN_H_ACTIVE = (1, 1)
     MAX_H_ACTIVE = (4095, 65536)
     MIN_H_FRONT = (1, 1)
@@ -39,6 +36,25 @@ class Constants(object):
     # kHz here
     MAX_P_CLOCK = (65535, 16777216)
     
+    # Monitor range limits: (name, min h rate, max h rate (Hz),
+    # min v rate, max v rate (1/1000 Hz), max pixel clock (10 kHz))
+    MONITOR_PROFILES = (
+        ('15khz-tv', 15000, 16000, 49000, 61000, 1600),
+        ('15khz-arcade', 15000, 16500, 47000, 63000, 2000),
+        ('25khz-arcade', 24000, 26000, 47000, 63000, 3200),
+        ('31khz-vga', 30000, 32000, 50000, 121000, 6000),
+        ('15-31khz-multisync', 15000, 32000, 47000, 121000, 6000),
+        ('pc-crt-70khz', 30000, 70000, 50000, 160000, 20300),
+    )
+
+    # Raspberry Pi pixel clock chains: (board, PLL reference (Hz), VCO min,
+    # VCO max (Hz), fractional multiplier bits, max pixel divider,
+    # min pixel clock, max pixel clock (10 kHz))
+    RPI_BOARD_PLLS = (
+        ('pi0-3', 19200000, 600000000, 2400000000, 8, 255, 250, 16200),
+        ('pi4', 54000000, 600000000, 3000000000, 8, 255, 250, 34000),
+    )
+
     INTERLACED_AVAILABLE = (True, True)
     NATIVE_AVAILABLE = (False, True)
 
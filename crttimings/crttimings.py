@@ -13,21 +13,158 @@
      crttimings --hres=<hres> --vres=<vres> --pixel-clock=<hertz>... [--interlace|--no-interlace]
 
 """
+import collections
+import contextlib
+import copy
 import functools
-import json
+import itertools
 import logging
+import operator
+import time
 
 from .constants import Constants, Constants2
+from . import monitors
 
 logger = logging.getLogger(__name__)
 
+# state versions are unique across all objects
+_versions = itertools.count(1)
+# attributes of DetailedResolution kept by restore_state
+_OBSERVER_ATTRIBUTES = ('observers', '_baseline', '_batch_depth')
+
+
+TimingRecord = collections.namedtuple('TimingRecord', [
+    'h_active', 'h_front', 'h_sync', 'h_back',
+    'v_active', 'v_front', 'v_sync', 'v_back',
+    'p_clock', 'h_polarity', 'v_polarity', 'interlaced', 'native',
+])
+TimingRecord.__doc__ = """Compact record of the fields defining a detailed resolution,
+   everything else can be derived from these."""
+
+# fields of DetailedResolution._as_dict, in order
+FIELDS = (
+    'h_active', 'h_front', 'h_sync', 'h_back', 'h_blank', 'h_total', 'h_polarity',
+    'v_active', 'v_front', 'v_sync', 'v_back', 'v_blank', 'v_total', 'v_polarity',
+    'stereo', 'last_rate', 'v_rate', 'actual_v_rate', 'h_rate', 'actual_h_rate',
+    'p_clock', 'interlaced', 'native',
+    'v_active_i', 'v_front_i', 'v_sync_i', 'v_back_i', 'v_blank_i', 'v_total_i', 'v_rate_i',
+)
+
+Sensitivity = collections.namedtuple('Sensitivity', ['p_clock', 'actual_h_rate', 'actual_v_rate'])
+Sensitivity.__doc__ = """Change of the pixel clock and actual rates for a one unit increase
+   of a field, in their units (10 kHz, Hz, 1/1000 Hz)."""
+
+PORCHES = ('h_front', 'h_sync', 'h_back', 'v_front', 'v_sync', 'v_back')
+
+StandardTiming = collections.namedtuple('StandardTiming', ['timing', 'text', 'ok', 'values'])
+StandardTiming.__doc__ = """Result of a timing standard: its index, its text, whether the
+   computation succeeded and the resulting TimingSnapshot."""
+
+TimingStandard = collections.namedtuple('TimingStandard', ['timing', 'name', 'text', 'function', 'description'])
+TimingStandard.__doc__ = """A registered timing standard: its index (the timing field of a
+   resolution), a short name, the text shown to users, the function
+   computing it and a description. function(detres) fills the timing of
+   detres in place and returns whether it succeeded, None for Manual."""
+
+
+class TimingRegistry(object):
+    """Timing standards by index. The functions and texts tuples, indexed by
+       timing, are rebuilt when a standard is registered so dispatching a
+       resolution to its standard is a single tuple lookup."""
+    def __init__(self):
+        self.standards = ()
+        self.functions = ()
+        self.texts = ()
+        self.by_name = {}
+
+    def __len__(self):
+        return len(self.standards)
+
+    def __iter__(self):
+        return iter(self.standards)
+
+    def __getitem__(self, timing):
+        return self.standards[timing]
+
+    def register(self, name, text, function, description=''):
+        """Adds a standard at the next index, returns its TimingStandard"""
+        if name in self.by_name:
+            raise ValueError("Timing standard {} is already registered".format(name))
+        standard = TimingStandard(len(self.standards), name, text, function, description)
+        self.standards += (standard,)
+        self.functions += (function,)
+        self.texts += (text,)
+        self.by_name[name] = standard
+        logger.debug("Timing standard %s registered as %s", name, standard.timing)
+        return standard
+
+    def get(self, name):
+        """TimingStandard registered as name, None if there is none"""
+        return self.by_name.get(name)
+
+    def automatic(self):
+        """Standards having a function, in index order"""
+        return tuple(standard for standard in self.standards if standard.function is not None)
+
+
+TIMING_STANDARDS = TimingRegistry()
+
+
+def register_timing_standard(name, text, function, description=''):
+    """Registers a timing standard, see TimingStandard. Standards are meant
+       to be registered at import time, so that worker processes know them
+       too. Returns the TimingStandard, its timing being the index to set."""
+    return TIMING_STANDARDS.register(name, text, function, description)
+
 
 class DetailedResolutionInterface(object):
+    """Front end of a DetailedResolution: the changes it notifies are
+       accumulated and rendered by refresh, at most once per debounce
+       seconds. Front ends call flush from their idle loop to render what
+       a burst of edits left pending."""
+    debounce = 0.05
+
+    def __init__(self, debounce=None):
+        if debounce is not None:
+            self.debounce = debounce
+        self.detailed_resolution = None
+        self.pending = {}
+        self.last_refresh = None
+        self.refreshing = False
+
     def connect(self, detres):
+        if self.detailed_resolution is not None:
+            self.detailed_resolution.unsubscribe(self.changed)
         self.detailed_resolution = detres
+        detres.subscribe(self.changed)
+
+    def changed(self, detres, changes):
+        """Observer of the connected resolution"""
+        for field, (old, new) in changes.items():
+            if field in self.pending:
+                old = self.pending[field][0]
+            if old == new:
+                self.pending.pop(field, None)
+            else:
+                self.pending[field] = (old, new)
+        now = time.monotonic()
+        if self.last_refresh is None or now - self.last_refresh >= self.debounce:
+            self.refresh()
+
+    def flush(self):
+        if self.pending:
+            self.refresh()
 
     def refresh(self):
         self.refreshing = True
+        changes, self.pending = self.pending, {}
+        self.last_refresh = time.monotonic()
+        self.render(changes)
+        self.refreshing = False
+
+    def render(self, changes):
+        """Shows the changed fields, changes maps them to (old, new)"""
+        pass
 
 
 
@@ -57,6 +194,117 @@ def requires_hvr(method=None, when_not_met=False, raise_exception=None):
         return method(self, *args, **kwargs)
     return f
 
+_get_fields = operator.attrgetter(*FIELDS)
+_get_stored = operator.itemgetter(*FIELDS)
+
+
+class TimingSnapshot(object):
+    """Immutable copy of every field of a detailed resolution (see FIELDS).
+
+       Snapshots behave as the namedtuple of FIELDS they used to be (built
+       by position or by field name, iterable, indexable, equal to the
+       tuple of their values) but hash once, when built: they can be
+       shared between threads, put in sets or used as cache keys as they
+       are. DetailedResolution.snapshot() builds one, to_resolution() goes
+       the other way.
+    """
+    __slots__ = FIELDS + ('_hash',)
+    _fields = FIELDS
+
+    def __init__(self, *values, **fields):
+        if fields:
+            try:
+                values += tuple(fields.pop(field) for field in FIELDS[len(values):])
+            except KeyError as e:
+                raise TypeError("TimingSnapshot misses the {} value".format(e))
+            if fields:
+                raise TypeError("TimingSnapshot has no field {}".format(', '.join(sorted(fields))))
+        if len(values) != len(FIELDS):
+            raise TypeError("TimingSnapshot takes {} values, {} given".format(len(FIELDS), len(values)))
+        for field, value in zip(FIELDS, values):
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, '_hash', hash(values))
+
+    @classmethod
+    def _make(cls, values):
+        return cls(*values)
+
+    @classmethod
+    def from_resolution(cls, detres):
+        """Snapshot of a DetailedResolution or TimingSnapshot"""
+        return cls(*_get_fields(detres))
+
+    def to_resolution(self, type=1):
+        """New DetailedResolution holding these values"""
+        detres = DetailedResolution(type)
+        detres.load_values(self.as_tuple())
+        return detres
+
+    def as_tuple(self):
+        return _get_fields(self)
+
+    def _asdict(self):
+        return collections.OrderedDict(zip(FIELDS, _get_fields(self)))
+
+    def _replace(self, **fields):
+        values = self._asdict()
+        values.update(fields)
+        return type(self)(**values)
+
+    def __iter__(self):
+        return iter(_get_fields(self))
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __getitem__(self, index):
+        return _get_fields(self)[index]
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TimingSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("TimingSnapshot is immutable")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, TimingSnapshot):
+            return self is other or (self._hash == other._hash and _get_fields(self) == _get_fields(other))
+        if isinstance(other, tuple):
+            return _get_fields(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __reduce__(self):
+        return (TimingSnapshot, _get_fields(self))
+
+    def __repr__(self):
+        return 'TimingSnapshot({})'.format(', '.join(
+            '{}={!r}'.format(field, value) for field, value in zip(FIELDS, _get_fields(self))))
+
+def shared_intermediate(method):
+    """Caches the result of a computation depending only on the active size,
+       refresh rate and scan type while a shared pass is running (see
+       DetailedResolution.calculate_all_timings)"""
+    name = method.__name__
+    @functools.wraps(method)
+    def f(self):
+        shared = self._shared
+        if shared is None:
+            return method(self)
+        key = (name, self.h_active, self.v_active, self.v_rate, self.interlaced)
+        try:
+            return shared[key]
+        except KeyError:
+            value = shared[key] = method(self)
+            return value
+    return f
+
 def new_detailed_resolution():
     a = DetailedResolution(int(True))
     a.v_active = 1080
@@ -66,6 +314,20 @@ def new_detailed_resolution():
     a.start()
     return a
 
+def detailed_resolution_for(h_active, v_active, v_rate, interlaced=False, timing=4):
+    """Build a resolution for the requested mode using a timing standard.
+
+       v_rate is in 1/1000 Hz (60000 = 60Hz), timing indexes timing_texts.
+    """
+    a = new_detailed_resolution()
+    a.set_timing(timing)
+    if bool(interlaced) != a.interlaced:
+        a.set_interlaced(interlaced)
+    a.set_h_active(h_active)
+    a.set_v_active(v_active)
+    a.set_v_rate(v_rate)
+    return a
+
 class DetailedResolution(object):
     """This is mostly a port of DetailedResolutionClass.cpp from ToastyX's CRU
        
@@ -113,13 +375,13 @@ class DetailedResolution(object):
         self.interlaced = False
         self.native = False
         
-        self.v_active_i  = Constants.BLANK
-        self.v_front_i   = Constants.BLANK
-        self.v_sync_i    = Constants.BLANK
-        self.v_back_i    = Constants.BLANK
-        self.v_blank_i   = Constants.BLANK
-        self.v_total_i   = Constants.BLANK
-        self.v_rate_i    = Constants.BLANK
+        # the other scan type view of the vertical fields (v_*_i): reset by
+        # every state change and computed again when read (None when
+        # outdated), BLANK until the first change. The view of v_rate is
+        # only reset when v_rate changes
+        self._mirror = (Constants.BLANK,) * 6
+        self._mirror_rate = Constants.BLANK
+        self._mirror_rate_of = Constants.BLANK
 
         self.reset_available = False
         self.reset_h_active = Constants.BLANK
@@ -137,6 +399,94 @@ class DetailedResolution(object):
         self.reset_interlaced = False
         self.reset_native = False
 
+        self.version = next(_versions)
+
+    # intermediate values cache of a shared pass, see shared_intermediate
+    _shared = None
+    # range limits of the target display (monitors.MonitorProfile), the
+    # is_valid_*_rate and is_valid_p_clock checks honour them when set
+    monitor = None
+    # observers notified of field changes, see subscribe
+    observers = None
+    _baseline = None
+    _batch_depth = 0
+    # rate fields (p_clock, h_rate, actual_v_rate, actual_h_rate) going
+    # with the mirror fields when they were kept by set_interlaced
+    _mirror_derived = None
+
+    def state_changed(self, mirror=None, mirror_rate=None, mirror_derived=None):
+        """Gives the object a new state version, called by every mutating
+           set_*. Versions are unique and increase over time: a cached value
+           computed from this object stays valid while its version is the
+           same.
+
+           The interlaced mirror fields are outdated, unless given (the
+           other scan type definition kept by set_interlaced or loaded).
+           v_rate_i is kept while v_rate stays the same, unless outdated by
+           update_interlaced_rate.
+
+           Observers are notified, unless a batch is running."""
+        if mirror_rate is None and self.v_rate == self._mirror_rate_of:
+            mirror_rate = self._mirror_rate
+        self._mirror = mirror
+        self._mirror_rate = mirror_rate
+        self._mirror_rate_of = self.v_rate
+        self._mirror_derived = mirror_derived
+        self.version = next(_versions)
+        if self.observers and not self._batch_depth:
+            self.notify()
+
+    def subscribe(self, observer):
+        """Calls observer(detres, changes) after each change of FIELDS
+           values, changes maps the fields that changed to (old, new)"""
+        if not self.observers:
+            self.observers = []
+            self._baseline = _get_fields(self)
+        self.observers.append(observer)
+
+    def unsubscribe(self, observer):
+        self.observers.remove(observer)
+
+    def notify(self):
+        """Notifies the observers of the fields changed since the last
+           notification"""
+        values = _get_fields(self)
+        changes = dict(
+            (field, (old, new))
+            for field, old, new in zip(FIELDS, self._baseline, values) if old != new)
+        self._baseline = values
+        if changes:
+            for observer in list(self.observers):
+                observer(self, changes)
+
+    def save_state(self):
+        """Copy of the object state for restore_state, the observers and
+           their bookkeeping left out"""
+        state = dict(self.__dict__)
+        for name in _OBSERVER_ATTRIBUTES:
+            state.pop(name, None)
+        return state
+
+    def restore_state(self, state):
+        """Goes back to a state returned by save_state, with its version.
+           Observers are notified of the fields that changed, unless a
+           batch is running"""
+        for name in set(self.__dict__).difference(state, _OBSERVER_ATTRIBUTES):
+            del self.__dict__[name]
+        self.__dict__.update(state)
+        if self.observers and not self._batch_depth:
+            self.notify()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Context in which changes are notified once, when it ends"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self.observers and not self._batch_depth:
+                self.notify()
 
     def start(self):
         self.calculate_h_back()
@@ -164,8 +514,73 @@ class DetailedResolution(object):
 
         self.update_interlaced()
         self.update_interlaced_rate()
+        self.state_changed()
+        return True
+
+
+    def as_record(self):
+        return TimingRecord(
+            self.h_active, self.h_front, self.h_sync, self.h_back,
+            self.v_active, self.v_front, self.v_sync, self.v_back,
+            self.p_clock, self.h_polarity, self.v_polarity, self.interlaced,
+            self.native)
+
+    def load_record(self, record):
+        """Sets every defining field at once from a TimingRecord, derived
+           fields are computed by a single update (pixel clock is kept)"""
+        (self.h_active, self.h_front, self.h_sync, self.h_back,
+         self.v_active, self.v_front, self.v_sync, self.v_back,
+         self.p_clock, self.h_polarity, self.v_polarity, self.interlaced,
+         self.native) = record
+        self.timing = 0
+        self.last = 0
+        self.last_rate = 2
+        self.update()
+        self.update_interlaced()
+        self.update_interlaced_rate()
+        self.state_changed()
+        return True
+
+    def snapshot(self):
+        """TimingSnapshot holding the current values"""
+        return TimingSnapshot(*_get_fields(self))
+
+    def load_dict(self, values):
+        """Sets every field from a mapping holding the FIELDS keys (as
+           returned by _as_dict), nothing is computed again"""
+        return self.load_values(_get_stored(values))
+
+    def load_values(self, stored):
+        """Same as load_dict, from the values in FIELDS order"""
+        self.__dict__.update(zip(FIELDS[:-7], stored[:-7]))
+        self.timing = 0
+        self.last = 0
+        self.state_changed(tuple(stored[-7:-1]), stored[-1])
         return True
 
+    def calculate_all_timings(self):
+        """StandardTiming results of every automatic timing standard for the
+           current active size, refresh rate and scan type, computed on a
+           copy: self is left untouched.
+
+           Intermediate values depending only on these inputs (CVT/GTF
+           h_period, v_sync for the aspect ratio...) are computed once and
+           shared between the standards.
+        """
+        work = copy.copy(self)
+        work.observers = None
+        initial = dict(work.__dict__)
+        shared = {}
+        results = []
+        for standard in TIMING_STANDARDS.automatic():
+            work.__dict__.update(initial)
+            work._shared = shared
+            work.timing = standard.timing
+            ok = work.update()
+            work.update_interlaced()
+            work.update_interlaced_rate()
+            results.append(StandardTiming(standard.timing, standard.text, bool(ok), work.snapshot()))
+        return tuple(results)
 
     def _as_dict(self):
         return dict(
@@ -221,7 +636,6 @@ class DetailedResolution(object):
         return fs.format(a=self,
                          h_pol="+" if self.h_polarity else "-",
                          v_pol="+" if self.v_polarity else "-")
-        return json.dumps(self._as_dict(), indent=4, sort_keys=True)
         
 
 
@@ -242,9 +656,9 @@ class DetailedResolution(object):
             return '- kHz'
 
     def get_timing_text(self, timing):
-        if not Constants.MIN_TIMING <= timing <= Constants.MAX_TIMING:
+        if not 0 <= timing < len(TIMING_STANDARDS.texts):
             return None
-        return self.timing_texts[timing]
+        return TIMING_STANDARDS.texts[timing]
 
     def get_timing(self):
         if not self.is_valid_timing():
@@ -256,18 +670,21 @@ class DetailedResolution(object):
         self.update()
         self.update_interlaced()
         self.update_interlaced_rate()
+        self.state_changed()
         return True
     
     def set_last(self, value):
         self.last = value
         self.timing = 0
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_h_active(self, value):
         self.h_active = int(value)
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_h_front(self, value):
@@ -275,6 +692,7 @@ class DetailedResolution(object):
         self.timing = 0
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_h_sync(self, value):
@@ -282,6 +700,7 @@ class DetailedResolution(object):
         self.timing = 0
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_h_back(self, value):
@@ -290,6 +709,7 @@ class DetailedResolution(object):
         self.last = 0
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_h_blank(self, value):
@@ -298,6 +718,7 @@ class DetailedResolution(object):
         self.last = 1
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_h_total(self, value):
@@ -306,22 +727,26 @@ class DetailedResolution(object):
         self.last = 2
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_h_polarity(self, value):
         self.h_polarity = value
         self.timing = 0
+        self.state_changed()
         return True
 
     def set_h_polarity(self, value):
         self.h_polarity = value
         self.timing = 0
+        self.state_changed()
         return True
 
     def set_v_active(self, value):
         self.v_active = int(value)
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_v_front(self, value):
@@ -329,6 +754,7 @@ class DetailedResolution(object):
         self.timing = 0
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_v_sync(self, value):
@@ -336,6 +762,7 @@ class DetailedResolution(object):
         self.timing = 0
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_v_back(self, value):
@@ -344,6 +771,7 @@ class DetailedResolution(object):
         self.last = 0
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_v_blank(self, value):
@@ -352,6 +780,7 @@ class DetailedResolution(object):
         self.last = 1
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_v_total(self, value):
@@ -360,17 +789,20 @@ class DetailedResolution(object):
         self.last = 2
         self.update()
         self.update_interlaced()
+        self.state_changed()
         return True
 
     def set_v_polarity(self, value):
         self.v_polarity = value
         self.timing = 0
+        self.state_changed()
         return True
 
     def set_last_rate(self, value):
         self.last_rate = value
         self.timing = 0
         self.update_interlaced_rate()
+        self.state_changed()
         return True
 
     def set_v_rate(self, value):
@@ -380,6 +812,7 @@ class DetailedResolution(object):
             self.last_rate = 0
         self.update()
         self.update_interlaced_rate()
+        self.state_changed()
         return True
 
     def set_h_rate(self, value):
@@ -388,6 +821,7 @@ class DetailedResolution(object):
         self.last_rate = 1
         self.update()
         self.update_interlaced_rate()
+        self.state_changed()
         return True
 
     def set_p_clock(self, value):
@@ -396,6 +830,7 @@ class DetailedResolution(object):
         self.last_rate = 2
         self.update()
         self.update_interlaced_rate()
+        self.state_changed()
         return True
 
 
@@ -406,38 +841,30 @@ class DetailedResolution(object):
         return self.interlaced
 
     def set_interlaced(self, value):
-        # the original code uses xor swaps. let's be more conservative
-        # as this is not supported in python and harms portability
+        # progressive and interlaced fields are two views of the same
+        # definition: the current fields become the mirror and the other
+        # way round. Once toggled, the rate fields of both views are kept
+        # too and toggling again only swaps them; until then they are
+        # computed from the mirror (by the timing standard, if any)
+        mirror = self.interlaced_view()
+        mirror_rate = self.v_rate_i
+        derived = self._mirror_derived
+        current = (self.v_active, self.v_front, self.v_sync, self.v_back, self.v_blank, self.v_total)
+        current_rate = self.v_rate
+        current_derived = (self.p_clock, self.h_rate, self.actual_v_rate, self.actual_h_rate)
         self.interlaced = bool(value)
-        n = self.v_active
-        self.v_active = self.v_active_i
-        self.v_active_i = n
-
-        n = self.v_front
-        self.v_front = self.v_front_i
-        self.v_front_i = n
+        self.v_active, self.v_front, self.v_sync, self.v_back, self.v_blank, self.v_total = mirror
+        self.v_rate = mirror_rate
 
-        n = self.v_sync
-        self.v_sync = self.v_sync_i
-        self.v_sync_i = n
-
-        n = self.v_back
-        self.v_back = self.v_back_i
-        self.v_back_i = n
-
-        n = self.v_blank
-        self.v_blank = self.v_blank_i
-        self.v_blank_i = n
-
-        n = self.v_total
-        self.v_total = self.v_total_i
-        self.v_total_i = n
-
-        n = self.v_rate
-        self.v_rate = self.v_rate_i
-        self.v_rate_i = n
-
-        return self.update()
+        ok = True
+        if derived is not None:
+            self.p_clock, self.h_rate, self.actual_v_rate, self.actual_h_rate = derived
+        elif self.timing:
+            ok = self.update()
+        else:
+            self.update_rates()
+        self.state_changed(current, current_rate, current_derived)
+        return ok
 
     def native_possible(self):
         return Constants.NATIVE_AVAILABLE[self.type]
@@ -447,6 +874,14 @@ class DetailedResolution(object):
 
     def set_native(self, value):
         self.native = value
+        self.state_changed()
+        return True
+
+    def set_monitor(self, profile):
+        """Sets the target display, a monitors.MonitorProfile, a profile
+           name or None"""
+        self.monitor = monitors.get_profile(profile)
+        self.state_changed()
         return True
 
     @property
@@ -456,6 +891,38 @@ class DetailedResolution(object):
         else:
             return 0
 
+    def sensitivity(self):
+        """dict porch -> Sensitivity for the manual computation of update
+           (timing 0), rounding left out, None when the rates are not
+           computed.
+
+           With last 0 a porch moves its total; then last_rate 0 keeps
+           v_rate (p_clock follows), 1 keeps h_rate and 2 keeps p_clock.
+           With last 1 or 2 totals are kept, porches change nothing.
+        """
+        if Constants.BLANK in (self.h_total, self.v_total, self.p_clock, self.v_rate, self.h_rate):
+            return None
+        if self.last != 0:
+            unchanged = Sensitivity(0.0, 0.0, 0.0)
+            return dict((porch, unchanged) for porch in PORCHES)
+        h_total = self.h_total
+        lines = self.v_total * 2 + self.interlaced_i
+        if self.last_rate == 0:
+            # p_clock = v_rate * h_total * lines / 20000000
+            h = Sensitivity(self.v_rate * lines / 20000000, 0.0, 0.0)
+            v = Sensitivity(self.v_rate * h_total * 2 / 20000000, self.v_rate * 2 / 2000, 0.0)
+        elif self.last_rate == 1:
+            # p_clock = h_rate * h_total / 10000, actual_v_rate = h_rate * 2000 / lines
+            h = Sensitivity(self.h_rate / 10000, 0.0, 0.0)
+            v = Sensitivity(0.0, 0.0, -self.h_rate * 2000 * 2 / lines ** 2)
+        else:
+            # actual_h_rate = p_clock * 10000 / h_total,
+            # actual_v_rate = p_clock * 20000000 / (h_total * lines)
+            h = Sensitivity(0.0, -self.p_clock * 10000 / h_total ** 2,
+                            -self.p_clock * 20000000 / (h_total ** 2 * lines))
+            v = Sensitivity(0.0, 0.0, -self.p_clock * 20000000 * 2 / (h_total * lines ** 2))
+        return dict((porch, h if porch[0] == 'h' else v) for porch in PORCHES)
+
     def recompute_blanking_and_clock(self):
         self.calculate_h_blank()
         self.calculate_h_total()
@@ -466,25 +933,14 @@ class DetailedResolution(object):
 
     @property
     def timing_functions(self):
-        return (
-            None,
-            self.calculate_lcd_standard,
-            self.calculate_lcd_native,
-            self.calculate_lcd_reduced,
-            self.calculate_crt_standard,
-            self.calculate_old_standard,
-        )
+        """Functions of the registered standards bound to self, update
+           dispatches through TIMING_STANDARDS.functions instead"""
+        return tuple(None if func is None else func.__get__(self)
+                     for func in TIMING_STANDARDS.functions)
     
     @property
     def timing_texts(self):
-        return (
-            'Manual',
-            'Automatic - LCD standard',
-            'Automatic - LCD native',
-            'Automatic - LCD reduced',
-            'Automatic - CRT standard',
-            'Automatic - Old standard',
-                )
+        return TIMING_STANDARDS.texts
     
 
     def reset(self):
@@ -506,6 +962,7 @@ class DetailedResolution(object):
         self.interlaced = self.reset_interlaced
         self.native = self.reset_native
         self.start()
+        self.state_changed()
         return True
 
     def update_reset(self):
@@ -530,13 +987,13 @@ class DetailedResolution(object):
     def update(self):
         ok = True
         if self.timing:
-            if not (self.is_valid_timing() and self.timing_functions[self.timing] is not None):
+            func = TIMING_STANDARDS.functions[self.timing] if self.is_valid_timing() else None
+            if func is None:
                 logger.debug("Invalid timing")
                 ok = False
-            if ok:
-                func = self.timing_functions[self.timing]
-                logger.debug("Timing function is %s", str(func.__name__))
-                ok = func()
+            else:
+                logger.debug("Timing function is %s", func.__name__)
+                ok = func(self)
             if not ok:
                 logger.debug("Timing function failed.")
                 self.h_front = self.h_sync = self.h_back = self.h_total = Constants.BLANK
@@ -566,6 +1023,12 @@ class DetailedResolution(object):
             self.calculate_v_back_from_v_total()
             self.calculate_v_blank()
 
+        self.update_rates()
+        return True
+
+    def update_rates(self):
+        """Computes the rate fields (p_clock, actual rates and the one of
+           v_rate, h_rate not held by last_rate) from the totals"""
         if self.last_rate == 0:
             logger.debug("0: computing PClock, setting h_rate")
             self.calculate_p_clock_from_v_rate()
@@ -588,44 +1051,81 @@ class DetailedResolution(object):
         return True
 
     def update_interlaced(self):
+        """Marks the mirror fields as outdated, they are computed again
+           when read"""
+        self._mirror = None
+        return True
+
+    def update_interlaced_rate(self):
+        self._mirror_rate = None
+        return True
+
+    def interlaced_view(self):
+        """(v_active, v_front, v_sync, v_back, v_blank, v_total) of the
+           other scan type"""
+        if self._mirror is None:
+            self._mirror = self.compute_interlaced_view()
+        return self._mirror
+
+    def compute_interlaced_view(self):
         logger.debug("update_interlaced")
-        self.v_active_i = self.v_active
-        self.v_front_i = self.v_front
-        self.v_sync_i = self.v_sync
-        self.v_back_i = self.v_back
+        v_active_i = self.v_active
+        v_front_i = self.v_front
+        v_sync_i = self.v_sync
+        v_back_i = self.v_back
 
         if self.is_supported_v_active() and self.interlaced:
             if self.v_active == 540 and self.v_front == 2 and self.v_sync == 5 and self.v_back == 15:
                 logger.debug("interlaced: qHD")
-                self.v_active_i = 1080
-                self.v_front_i = 4
-                self.v_sync_i = 5
-                self.v_back_i = 36
+                v_active_i = 1080
+                v_front_i = 4
+                v_sync_i = 5
+                v_back_i = 36
             elif self.v_active < Constants.MAX_V_ACTIVE[self.type] // 2:
-                self.v_active_i = self.v_active * 2
+                v_active_i = self.v_active * 2
         elif self.is_supported_v_active() and self.v_active % 2 == 0:
             if self.v_active == 1080 and self.v_front == 4 and self.v_sync == 5 and self.v_back == 36:
-                self.v_active_i = 540
-                self.v_front_i = 2
-                self.v_sync_i = 5
-                self.v_back_i = 15
+                v_active_i = 540
+                v_front_i = 2
+                v_sync_i = 5
+                v_back_i = 15
             elif self.is_supported_h_active():
                 if (self.v_active * 125 > self.h_active * 51 or self.h_active in (1440, 2880)) and (472 <= self.v_active <= 488 or 566 <= self.v_active <= 586):
-                    self.v_active_i = int(self.v_active // 2)
+                    v_active_i = int(self.v_active // 2)
             else:
                 if 472 <= self.v_active <= 488 or self.v_active >= 566:
-                    self.v_active_i = self.v_active // 2
+                    v_active_i = self.v_active // 2
         
-        self.v_blank_i = self.v_front_i + self.v_sync_i + self.v_back_i
-        self.v_total_i = self.v_active_i + self.v_blank_i
-        return True
+        v_blank_i = v_front_i + v_sync_i + v_back_i
+        v_total_i = v_active_i + v_blank_i
+        return (v_active_i, v_front_i, v_sync_i, v_back_i, v_blank_i, v_total_i)
+
+    def _set_mirror(self, index, value):
+        mirror = list(self.interlaced_view())
+        mirror[index] = value
+        self._mirror = tuple(mirror)
+        self._mirror_derived = None
+
+    v_active_i = property(lambda self: self.interlaced_view()[0], lambda self, value: self._set_mirror(0, value))
+    v_front_i = property(lambda self: self.interlaced_view()[1], lambda self, value: self._set_mirror(1, value))
+    v_sync_i = property(lambda self: self.interlaced_view()[2], lambda self, value: self._set_mirror(2, value))
+    v_back_i = property(lambda self: self.interlaced_view()[3], lambda self, value: self._set_mirror(3, value))
+    v_blank_i = property(lambda self: self.interlaced_view()[4], lambda self, value: self._set_mirror(4, value))
+    v_total_i = property(lambda self: self.interlaced_view()[5], lambda self, value: self._set_mirror(5, value))
 
-
-    def update_interlaced_rate(self):
-        self.v_rate_i = self.v_rate
-        if self.is_supported_v_rate() and not self.interlaced and self.v_rate < 45000:
-            self.v_rate_i = self.v_rate * 2
-        return True
+    @property
+    def v_rate_i(self):
+        if self._mirror_rate is None:
+            self._mirror_rate = self.v_rate
+            if self.is_supported_v_rate() and not self.interlaced and self.v_rate < 45000:
+                self._mirror_rate = self.v_rate * 2
+        return self._mirror_rate
+
+    @v_rate_i.setter
+    def v_rate_i(self, value):
+        self._mirror_rate = value
+        self._mirror_rate_of = self.v_rate
+        self._mirror_derived = None
 
     @requires_hvr
     def calculate_native(self, digital):
@@ -803,7 +1303,7 @@ class DetailedResolution(object):
                 # recompute timings
                 self.recompute_blanking_and_clock()
             # enter here if previous optimization failed
-            if p_clock > 33000:
+            if self.p_clock > 33000:
                 old_v_rate = self.v_rate
                 self.calculate_cvtrb()
                 self.calculate_p_clock_from_v_rate()
@@ -823,7 +1323,7 @@ class DetailedResolution(object):
                     break
                 self.recompute_blanking_and_clock()
             # enter here if unsuccessful
-            if p_clock > 40000:
+            if self.p_clock > 40000:
                 old_v_rate = self.v_rate
                 self.calculate_cvtrb()
                 self.calculate_p_clock_from_v_rate()
@@ -999,7 +1499,7 @@ class DetailedResolution(object):
             self.calculate_gtf()
             self.calculate_p_clock_from_v_rate()
             self.calculate_actual_v_rate()
-            self.v_rate = sef.actual_v_rate
+            self.v_rate = self.actual_v_rate
             self.calculate_gtf()
             self.calculate_p_clock_from_v_rate()
             self.v_rate = old_v_rate
@@ -1074,6 +1574,7 @@ class DetailedResolution(object):
         return self.is_valid_rate()
 
 
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_h_period_for_cvt(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
@@ -1082,12 +1583,14 @@ class DetailedResolution(object):
 
 
 
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_h_period_for_cvtrb(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
             return Constants.BLANK
         return (1000000000000000000 * 2 // self.v_rate - 460000000000 * 2) // (self.v_active * 2)
 
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_h_period_for_gtf(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
@@ -1132,6 +1635,7 @@ class DetailedResolution(object):
             return Constants.BLANK
         return self.get_h_blank_for_gtf() // 2
 
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_h_blank_for_cvt(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
@@ -1144,6 +1648,7 @@ class DetailedResolution(object):
 
         return self.h_active * ideal_duty_cycle // (100000000000000 - ideal_duty_cycle) // 16 * 16
     
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_h_blank_for_gtf(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
@@ -1167,6 +1672,7 @@ class DetailedResolution(object):
         return 1
 
 
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_v_sync_for_cvt(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
@@ -1188,6 +1694,7 @@ class DetailedResolution(object):
         return 3
 
 
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_v_back_for_cvt(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
@@ -1200,17 +1707,19 @@ class DetailedResolution(object):
         return vback
 
 
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_v_back_for_cvtrb(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
             return Constants.BLANK
         
-        v_blank = 460000000000 // self.get_period_for_cvtrb() + 1
+        v_blank = 460000000000 // self.get_h_period_for_cvtrb() + 1
         v_back = v_blank - self.get_v_front_for_cvt() - self.get_v_sync_for_cvt()
         if v_back < 6:
             v_back = 6
         return v_back
 
+    @shared_intermediate
     @requires_hvr(when_not_met=Constants.BLANK)
     def get_v_back_for_gtf(self):
         if not (self.is_supported_h_active() and self.is_supported_v_active() and self.is_supported_v_rate()):
@@ -1408,7 +1917,7 @@ class DetailedResolution(object):
                
 
     def is_valid_timing(self):
-        return Constants.MIN_TIMING <= self.timing <= Constants.MAX_TIMING
+        return 0 <= self.timing < len(TIMING_STANDARDS.functions)
         pass
 
     def is_valid_h_active(self):
@@ -1462,18 +1971,24 @@ class DetailedResolution(object):
         pass
 
     def is_valid_h_rate(self):
+        if self.monitor is not None and not self.monitor.min_h_rate <= self.h_rate <= self.monitor.max_h_rate:
+            return False
         return Constants.MIN_H_RATE[self.type] <= self.h_rate <= Constants.MAX_H_RATE[self.type]
 
     def is_valid_p_clock(self):
+        if self.monitor is not None and self.p_clock > self.monitor.max_p_clock:
+            return False
         return Constants.MIN_P_CLOCK[self.type] <= self.p_clock <= Constants.MAX_P_CLOCK[self.type]
 
     def is_valid_actual_v_rate(self):
+        if self.monitor is not None and not self.monitor.min_v_rate <= self.actual_v_rate <= self.monitor.max_v_rate:
+            return False
         return Constants.MIN_V_RATE[self.type] <= self.actual_v_rate <= Constants.MAX_V_RATE[self.type]
-        pass
 
     def is_valid_actual_h_rate(self):
+        if self.monitor is not None and not self.monitor.min_h_rate <= self.actual_h_rate <= self.monitor.max_h_rate:
+            return False
         return Constants.MIN_H_RATE[self.type] <= self.actual_h_rate <= Constants.MAX_H_RATE[self.type]
-        pass
 
     def is_supported_h_active(self):
         return Constants.MIN_H_ACTIVE[1] <= self.h_active <= Constants.MAX_H_ACTIVE[1]
@@ -1584,5 +2099,20 @@ class DetailedResolution(object):
         return min(Constants.MAX_V_TOTAL[type], inrangevactive + Constants.MAX_V_BLANK[type])
 
 
+register_timing_standard('manual', 'Manual', None,
+                         "Timing entered field by field")
+register_timing_standard('lcd-standard', 'Automatic - LCD standard', DetailedResolution.calculate_lcd_standard,
+                         "Known LCD timing of the mode, else CVT reduced blanking")
+register_timing_standard('lcd-native', 'Automatic - LCD native', DetailedResolution.calculate_lcd_native,
+                         "Known native LCD timing of the mode, else CVT reduced blanking at 60 Hz")
+register_timing_standard('lcd-reduced', 'Automatic - LCD reduced', DetailedResolution.calculate_lcd_reduced,
+                         "Known reduced timing of the mode, else CVT reduced blanking")
+register_timing_standard('crt-standard', 'Automatic - CRT standard', DetailedResolution.calculate_crt_standard,
+                         "Known CRT timing of the mode, else CVT")
+register_timing_standard('old-standard', 'Automatic - Old standard', DetailedResolution.calculate_old_standard,
+                         "Known older CRT timing of the mode, else GTF")
+
 
-__all__ = ['DetailedResolution', 'new_detailed_resolution']
+__all__ = ['DetailedResolution', 'TimingRecord', 'TimingSnapshot', 'StandardTiming', 'Sensitivity',
+           'TimingStandard', 'TimingRegistry', 'TIMING_STANDARDS', 'register_timing_standard',
+           'FIELDS', 'PORCHES', 'new_detailed_resolution', 'detailed_resolution_for']
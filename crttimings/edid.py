@@ -0,0 +1,275 @@
+"""edid: read and write detailed timing descriptors (DTD) of EDID dumps.
+
+   Descriptors are decoded straight from any object supporting the buffer
+   protocol (bytes, bytearray, memoryview, mmap): fields are read byte by
+   byte at their offset, nothing is sliced or copied per descriptor.
+   Encoding writes in place into a preallocated bytearray and returns the
+   sum of the bytes written, so block checksums are built incrementally.
+
+   DTD layout (18 bytes):
+     0-1   pixel clock, 10 kHz units, little endian (0: display descriptor)
+     2-4   h_active, h_blank (low bytes, then high nibbles)
+     5-7   v_active, v_blank (low bytes, then high nibbles)
+     8-11  h_front, h_sync, v_front, v_sync (low bits, then high bits)
+     12-16 image size and borders
+     17    flags: interlaced, stereo, sync type and polarities
+"""
+import logging
+import mmap
+import os
+
+from .constants import Constants
+from .crttimings import DetailedResolution, TimingRecord
+
+logger = logging.getLogger(__name__)
+
+
+EDID_HEADER = (0x00, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0x00)
+EDID_BLOCK_SIZE = 128
+DTD_SIZE = 18
+BASE_DTD_OFFSETS = (54, 72, 90, 108)
+EXTENSION_COUNT_OFFSET = 126
+CEA_EXTENSION_TAG = 0x02
+CHECKSUM_OFFSET = 127
+
+# header, "CRT" manufacturer, EDID 1.3, digital input, sRGB chromaticity,
+# no established or standard timings: everything before the first DTD
+EDID_BASE_PREFIX = bytes(bytearray(
+    EDID_HEADER +
+    (0x0e, 0x54, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x1e) +
+    (0x01, 0x03) +
+    (0x80, 0x00, 0x00, 0x78, 0x0a) +
+    (0xee, 0x91, 0xa3, 0x54, 0x4c, 0x99, 0x26, 0x0f, 0x50, 0x54) +
+    (0x00, 0x00, 0x00) +
+    (0x01, 0x01) * 8))
+EDID_BASE_PREFIX_SUM = sum(bytearray(EDID_BASE_PREFIX))
+# dummy descriptor filling unused DTD slots
+DUMMY_DESCRIPTOR = bytes(bytearray((0x00, 0x00, 0x00, 0x10) + (0x00,) * 14))
+
+# type 0 (EDID) limits of the encoded fields
+DTD_LIMITS = (
+    ('h_active', Constants.MIN_H_ACTIVE[0], Constants.MAX_H_ACTIVE[0]),
+    ('h_front', Constants.MIN_H_FRONT[0], Constants.MAX_H_FRONT[0]),
+    ('h_sync', Constants.MIN_H_SYNC[0], Constants.MAX_H_SYNC[0]),
+    ('h_back', Constants.MIN_H_BACK[0], Constants.MAX_H_BACK[0]),
+    ('v_active', Constants.MIN_V_ACTIVE[0], Constants.MAX_V_ACTIVE[0]),
+    ('v_front', Constants.MIN_V_FRONT[0], Constants.MAX_V_FRONT[0]),
+    ('v_sync', Constants.MIN_V_SYNC[0], Constants.MAX_V_SYNC[0]),
+    ('v_back', Constants.MIN_V_BACK[0], Constants.MAX_V_BACK[0]),
+    ('p_clock', Constants.MIN_P_CLOCK[0], Constants.MAX_P_CLOCK[0]),
+)
+
+
+def decode_dtd(buf, offset=0, native=False):
+    """TimingRecord for the descriptor at offset, None when the descriptor
+       is a display descriptor (name, range limits...)"""
+    p_clock = buf[offset] | buf[offset + 1] << 8
+    if p_clock == 0:
+        return None
+    hi_h = buf[offset + 4]
+    hi_v = buf[offset + 7]
+    hi_porches = buf[offset + 11]
+    v_porches = buf[offset + 10]
+    flags = buf[offset + 17]
+
+    h_active = buf[offset + 2] | (hi_h & 0xf0) << 4
+    h_blank = buf[offset + 3] | (hi_h & 0x0f) << 8
+    v_active = buf[offset + 5] | (hi_v & 0xf0) << 4
+    v_blank = buf[offset + 6] | (hi_v & 0x0f) << 8
+    h_front = buf[offset + 8] | (hi_porches & 0xc0) << 2
+    h_sync = buf[offset + 9] | (hi_porches & 0x30) << 4
+    v_front = v_porches >> 4 | (hi_porches & 0x0c) << 2
+    v_sync = v_porches & 0x0f | (hi_porches & 0x03) << 4
+
+    if flags & 0x18 == 0x18:
+        # digital separate sync
+        h_polarity = bool(flags & 0x02)
+        v_polarity = bool(flags & 0x04)
+    else:
+        h_polarity = bool(flags & 0x02)
+        v_polarity = False
+
+    return TimingRecord(
+        h_active, h_front, h_sync, h_blank - h_front - h_sync,
+        v_active, v_front, v_sync, v_blank - v_front - v_sync,
+        p_clock, h_polarity, v_polarity, bool(flags & 0x80), native)
+
+
+def is_edid_header(buf, offset=0):
+    for i, byte in enumerate(EDID_HEADER):
+        if buf[offset + i] != byte:
+            return False
+    return True
+
+
+def iter_edid_records(buf):
+    """Yields a TimingRecord for every DTD of every EDID found in buf.
+
+       buf holds EDID dumps back to back (base block followed by its
+       extension blocks). The first DTD of the base block and the native
+       DTDs announced by CEA-861 extensions have the native flag set.
+    """
+    size = len(buf)
+    offset = 0
+    while offset + EDID_BLOCK_SIZE <= size:
+        if not is_edid_header(buf, offset):
+            logger.debug("No EDID header at %s, skipping block", offset)
+            offset += EDID_BLOCK_SIZE
+            continue
+
+        for index, dtd in enumerate(BASE_DTD_OFFSETS):
+            record = decode_dtd(buf, offset + dtd, index == 0)
+            if record is not None:
+                yield record
+
+        extensions = buf[offset + EXTENSION_COUNT_OFFSET]
+        block = offset + EDID_BLOCK_SIZE
+        offset += EDID_BLOCK_SIZE * (1 + extensions)
+        while block < offset and block + EDID_BLOCK_SIZE <= size:
+            if buf[block] == CEA_EXTENSION_TAG and buf[block + 2] >= 4:
+                natives = buf[block + 3] & 0x0f
+                dtd = block + buf[block + 2]
+                index = 0
+                while dtd + DTD_SIZE < block + EDID_BLOCK_SIZE:
+                    record = decode_dtd(buf, dtd, index < natives)
+                    if record is None:
+                        break
+                    yield record
+                    dtd += DTD_SIZE
+                    index += 1
+            block += EDID_BLOCK_SIZE
+
+
+def iter_edid_resolutions(buf, type=0):
+    """Same as iter_edid_records but yields DetailedResolution objects"""
+    for record in iter_edid_records(buf):
+        detres = DetailedResolution(type)
+        detres.load_record(record)
+        yield detres
+
+
+def iter_edid_file(path, records=True):
+    """Yields the DTDs of every EDID dump in a file, mapped in memory.
+
+       Yields TimingRecord objects, or DetailedResolution objects when
+       records is False.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                if records:
+                    for record in iter_edid_records(view):
+                        yield record
+                else:
+                    for detres in iter_edid_resolutions(view):
+                        yield detres
+            finally:
+                view.release()
+
+
+def check_dtd_limits(timing):
+    """Values of the DTD_LIMITS fields of timing rounded to integers (some
+       timing standards compute floats), raises ValueError if one cannot
+       be stored in a legacy DTD"""
+    values = []
+    for field, mn, mx in DTD_LIMITS:
+        value = int(round(getattr(timing, field)))
+        if not mn <= value <= mx:
+            raise ValueError("{} = {} out of EDID range [{}, {}]".format(field, value, mn, mx))
+        values.append(value)
+    h_active, h_front, h_sync, h_back, v_active, v_front, v_sync, v_back, p_clock = values
+    h_blank = h_front + h_sync + h_back
+    if not Constants.MIN_H_BLANK[0] <= h_blank <= Constants.MAX_H_BLANK[0]:
+        raise ValueError("h_blank = {} out of EDID range".format(h_blank))
+    v_blank = v_front + v_sync + v_back
+    if not Constants.MIN_V_BLANK[0] <= v_blank <= Constants.MAX_V_BLANK[0]:
+        raise ValueError("v_blank = {} out of EDID range".format(v_blank))
+    return values
+
+
+def encode_dtd(timing, buf, offset=0):
+    """Writes timing (a DetailedResolution or TimingRecord) as an 18 byte
+       DTD into buf at offset, returns the sum of the bytes written"""
+    h_active, h_front, h_sync, h_back, v_active, v_front, v_sync, v_back, p_clock = check_dtd_limits(timing)
+    h_blank = h_front + h_sync + h_back
+    v_blank = v_front + v_sync + v_back
+
+    flags = 0x18
+    if timing.interlaced:
+        flags |= 0x80
+    if timing.v_polarity:
+        flags |= 0x04
+    if timing.h_polarity:
+        flags |= 0x02
+
+    b = (
+        p_clock & 0xff,
+        p_clock >> 8,
+        h_active & 0xff,
+        h_blank & 0xff,
+        (h_active >> 8) << 4 | h_blank >> 8,
+        v_active & 0xff,
+        v_blank & 0xff,
+        (v_active >> 8) << 4 | v_blank >> 8,
+        h_front & 0xff,
+        h_sync & 0xff,
+        (v_front & 0x0f) << 4 | v_sync & 0x0f,
+        (h_front >> 8) << 6 | (h_sync >> 8) << 4 | (v_front >> 4) << 2 | v_sync >> 4,
+        0, 0, 0, 0, 0,
+        flags,
+    )
+    buf[offset:offset + DTD_SIZE] = b
+    return sum(b)
+
+
+def encode_dtds(timings, buf, offset=0):
+    """Writes DTDs back to back into buf, returns (next offset, byte sum)"""
+    total = 0
+    for timing in timings:
+        total += encode_dtd(timing, buf, offset)
+        offset += DTD_SIZE
+    return offset, total
+
+
+def encode_edid_block(timings, buf=None, offset=0, prefix=EDID_BASE_PREFIX, prefix_sum=None):
+    """Writes a 128 byte EDID base block holding up to four DTDs (the first
+       one is the preferred timing) into buf at offset, returns buf.
+
+       prefix holds the 54 bytes preceding the DTDs, pass prefix_sum along
+       with it when encoding many blocks to skip summing it each time.
+    """
+    if len(timings) > len(BASE_DTD_OFFSETS):
+        raise ValueError("An EDID base block holds at most {} DTDs".format(len(BASE_DTD_OFFSETS)))
+    if buf is None:
+        buf = bytearray(offset + EDID_BLOCK_SIZE)
+    if prefix_sum is None:
+        prefix_sum = EDID_BASE_PREFIX_SUM if prefix is EDID_BASE_PREFIX else sum(bytearray(prefix))
+
+    buf[offset:offset + BASE_DTD_OFFSETS[0]] = prefix
+    end, total = encode_dtds(timings, buf, offset + BASE_DTD_OFFSETS[0])
+    for dtd in BASE_DTD_OFFSETS[len(timings):]:
+        buf[offset + dtd:offset + dtd + DTD_SIZE] = DUMMY_DESCRIPTOR
+        total += DUMMY_DESCRIPTOR[3]
+    buf[offset + EXTENSION_COUNT_OFFSET] = 0
+    buf[offset + CHECKSUM_OFFSET] = -(prefix_sum + total) & 0xff
+    return buf
+
+
+def encode_edid_blocks(timings_per_block, buf=None, offset=0, prefix=EDID_BASE_PREFIX):
+    """Writes one EDID base block per item of timings_per_block back to back
+       into buf (allocated when None), returns buf"""
+    timings_per_block = list(timings_per_block)
+    if buf is None:
+        buf = bytearray(offset + EDID_BLOCK_SIZE * len(timings_per_block))
+    prefix_sum = sum(bytearray(prefix))
+    for timings in timings_per_block:
+        encode_edid_block(timings, buf, offset, prefix, prefix_sum)
+        offset += EDID_BLOCK_SIZE
+    return buf
+
+
+__all__ = ['decode_dtd', 'iter_edid_records', 'iter_edid_resolutions', 'iter_edid_file',
+           'encode_dtd', 'encode_dtds', 'encode_edid_block', 'encode_edid_blocks']
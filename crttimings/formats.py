@@ -0,0 +1,226 @@
+"""formats: text representations of detailed resolutions understood by
+   other tools.
+
+   hdmi_timings follows the Raspberry Pi config.txt syntax:
+     hdmi_timings=<h_active> <h_sync_polarity> <h_front_porch> <h_sync_pulse>
+                  <h_back_porch> <v_active> <v_sync_polarity> <v_front_porch>
+                  <v_sync_pulse> <v_back_porch> <v_sync_offset_a>
+                  <v_sync_offset_b> <pixel_rep> <frame_rate> <interlaced>
+                  <pixel_freq> <aspect_ratio>
+
+   Interlaced modes carry frame lines in v_active (DetailedResolution stores
+   field lines), porches are per field.
+
+   Modeline follows the X11 syntax:
+     Modeline "<name>" <pclk MHz> <hdisp> <hsyncstart> <hsyncend> <htotal>
+              <vdisp> <vsyncstart> <vsyncend> <vtotal> [flags]
+   where vertical values of interlaced modes count frame lines.
+
+   Parsers are plain tokenizers (str.split/find, no regular expressions)
+   producing TimingRecord tuples; DetailedResolution objects are built from
+   them with a single update.
+"""
+import logging
+
+from .crttimings import DetailedResolution, TimingRecord
+
+logger = logging.getLogger(__name__)
+
+
+# (width, height, hdmi_timings aspect ratio code)
+HDMI_ASPECT_RATIOS = (
+    (4, 3, 1),
+    (14, 9, 2),
+    (16, 9, 3),
+    (5, 4, 4),
+    (16, 10, 5),
+    (15, 9, 6),
+    (21, 9, 7),
+    (64, 27, 8),
+)
+
+
+def hdmi_aspect_ratio(h_active, v_active):
+    """Closest hdmi_timings aspect ratio code for a frame size
+
+       Low resolution progressive modes (240p, 288p) are line doubled TV
+       modes and are compared as such.
+    """
+    if v_active <= 288:
+        v_active *= 2
+    best = HDMI_ASPECT_RATIOS[0][2]
+    best_distance = None
+    for w, h, code in HDMI_ASPECT_RATIOS:
+        distance = abs(h_active * h - v_active * w) * 1000 // (v_active * w)
+        if best_distance is None or distance < best_distance:
+            best, best_distance = code, distance
+    return best
+
+
+def _int(value):
+    """Field value as an integer, some timing standards compute floats"""
+    return int(round(value))
+
+
+def hdmi_timings_text(detres):
+    """hdmi_timings= line for a resolution"""
+    if detres.interlaced:
+        v_active = _int(detres.v_active) * 2
+    else:
+        v_active = _int(detres.v_active)
+    return "hdmi_timings={} {} {} {} {} {} {} {} {} {} 0 0 0 {} {} {} {}".format(
+        _int(detres.h_active),
+        int(bool(detres.h_polarity)),
+        _int(detres.h_front),
+        _int(detres.h_sync),
+        _int(detres.h_back),
+        v_active,
+        int(bool(detres.v_polarity)),
+        _int(detres.v_front),
+        _int(detres.v_sync),
+        _int(detres.v_back),
+        (_int(detres.actual_v_rate) + 500) // 1000,
+        int(bool(detres.interlaced)),
+        _int(detres.p_clock) * 10000,
+        hdmi_aspect_ratio(_int(detres.h_active), v_active),
+    )
+
+
+def hdmi_config_fragment(detres):
+    """config.txt lines selecting a custom mode with hdmi_timings"""
+    return "hdmi_group=2\nhdmi_mode=87\n{}\n".format(hdmi_timings_text(detres))
+
+
+def modeline_text(detres, name=None):
+    """X11 Modeline for a resolution"""
+    h_active = _int(detres.h_active)
+    h_sync_start = h_active + _int(detres.h_front)
+    h_sync_end = h_sync_start + _int(detres.h_sync)
+    h_total = h_sync_end + _int(detres.h_back)
+    v_active, v_front, v_sync, v_back = (
+        _int(detres.v_active), _int(detres.v_front), _int(detres.v_sync), _int(detres.v_back))
+    if detres.interlaced:
+        v_active, v_front, v_sync, v_back = v_active * 2, v_front * 2, v_sync * 2, v_back * 2 + 1
+    v_sync_start = v_active + v_front
+    v_sync_end = v_sync_start + v_sync
+    v_total = v_sync_end + v_back
+    if name is None:
+        name = "{}x{}{}".format(h_active, v_active, "i" if detres.interlaced else "")
+    p_clock = _int(detres.p_clock)
+    return 'Modeline "{}" {}.{:02d} {} {} {} {} {} {} {} {} {}hsync {}vsync{}'.format(
+        name, p_clock // 100, p_clock % 100,
+        h_active, h_sync_start, h_sync_end, h_total,
+        v_active, v_sync_start, v_sync_end, v_total,
+        "+" if detres.h_polarity else "-",
+        "+" if detres.v_polarity else "-",
+        " Interlace" if detres.interlaced else "")
+
+
+def _mhz_to_p_clock(token):
+    """MHz text to 10 kHz units, without going through a float"""
+    whole, _, fraction = token.partition('.')
+    fraction = (fraction + '000')[:3]
+    value = int(whole or '0') * 1000 + int(fraction)
+    return (value + 5) // 10
+
+
+def parse_modeline(line):
+    """TimingRecord for a Modeline (or xrandr --newmode) line, None when the
+       line does not hold one"""
+    start = line.find('"')
+    if start >= 0:
+        end = line.find('"', start + 1)
+        if end < 0:
+            return None
+        tokens = line[end + 1:].split()
+    else:
+        # unquoted name: Modeline <name> <pclk> ... or
+        # xrandr --newmode <name> <pclk> ...
+        tokens = line.split()
+        if '--newmode' in tokens:
+            tokens = tokens[tokens.index('--newmode') + 2:]
+        else:
+            tokens = tokens[2:]
+    if len(tokens) < 9:
+        return None
+    try:
+        p_clock = _mhz_to_p_clock(tokens[0])
+        (h_active, h_sync_start, h_sync_end, h_total,
+         v_active, v_sync_start, v_sync_end, v_total) = [int(t) for t in tokens[1:9]]
+    except ValueError:
+        return None
+
+    h_polarity = v_polarity = interlaced = False
+    for flag in tokens[9:]:
+        flag = flag.lower()
+        if flag == '+hsync':
+            h_polarity = True
+        elif flag == '+vsync':
+            v_polarity = True
+        elif flag == 'interlace':
+            interlaced = True
+
+    v_front = v_sync_start - v_active
+    v_sync = v_sync_end - v_sync_start
+    v_back = v_total - v_sync_end
+    if interlaced:
+        v_active, v_front, v_sync, v_back = v_active // 2, v_front // 2, v_sync // 2, v_back // 2
+    return TimingRecord(
+        h_active, h_sync_start - h_active, h_sync_end - h_sync_start, h_total - h_sync_end,
+        v_active, v_front, v_sync, v_back,
+        p_clock, h_polarity, v_polarity, interlaced, False)
+
+
+def parse_hdmi_timings(line):
+    """TimingRecord for an hdmi_timings= config line (or vcgencmd
+       hdmi_timings command), None when the line does not hold one"""
+    start = line.find('hdmi_timings')
+    if start < 0:
+        return None
+    tokens = line[start + 12:].lstrip(' \t=').split()
+    if len(tokens) < 17:
+        return None
+    try:
+        values = [int(t) for t in tokens[:17]]
+    except ValueError:
+        return None
+    interlaced = bool(values[14])
+    v_active = values[5] // 2 if interlaced else values[5]
+    return TimingRecord(
+        values[0], values[2], values[3], values[4],
+        v_active, values[7], values[8], values[9],
+        (values[15] + 5000) // 10000, bool(values[1]), bool(values[6]), interlaced, False)
+
+
+def parse_timing_line(line):
+    """TimingRecord for a hdmi_timings or Modeline line, None otherwise"""
+    stripped = line.lstrip()
+    if not stripped or stripped[0] == '#':
+        return None
+    if 'hdmi_timings' in stripped:
+        return parse_hdmi_timings(stripped)
+    if 'odeline' in stripped or '--newmode' in stripped:
+        return parse_modeline(stripped)
+    return None
+
+
+def iter_timing_records(stream):
+    """Yields a TimingRecord for every Modeline or hdmi_timings line of a
+       text stream, other lines are skipped"""
+    for line in stream:
+        record = parse_timing_line(line)
+        if record is not None:
+            yield record
+
+
+def iter_timing_resolutions(stream, type=1):
+    """Same as iter_timing_records but yields DetailedResolution objects"""
+    for record in iter_timing_records(stream):
+        detres = DetailedResolution(type)
+        detres.load_record(record)
+        yield detres
+
+
+__all__ = ['hdmi_aspect_ratio', 'hdmi_timings_text', 'hdmi_config_fragment', 'modeline_text',
+           'parse_modeline', 'parse_hdmi_timings', 'parse_timing_line',
+           'iter_timing_records', 'iter_timing_resolutions']
@@ -0,0 +1,190 @@
+"""intervals: feasible ranges of the timing fields by interval propagation.
+
+   Given some fixed fields (actives, porches...), windows on the pixel clock
+   and actual rates and an optional monitor profile, feasible_ranges()
+   returns the (low, high) range every field can still take, or None when
+   no timing satisfies them all.
+
+   Initial ranges come from the Constants limits and the get_min_* /
+   get_max_* helpers of DetailedResolution, evaluated with the fixed fields
+   set. They are then narrowed in rounds, until nothing changes, by the
+   relations between the fields:
+     h_blank = h_front + h_sync + h_back    h_total = h_active + h_blank
+     v_blank = v_front + v_sync + v_back    v_total = v_active + v_blank
+     actual_h_rate = p_clock * 10000 // h_total
+     actual_v_rate = p_clock * 20000000 // (h_total * (2 * v_total + interlaced))
+   the last two also binding the rates together through the v_total lines.
+   Ranges are sound, not tight: a field value out of its range is never
+   part of a solution, a value within it may not be.
+"""
+import logging
+
+from .constants import Constants
+from .crttimings import DetailedResolution
+from . import monitors
+
+logger = logging.getLogger(__name__)
+
+
+RANGE_FIELDS = (
+    'h_active', 'h_front', 'h_sync', 'h_back', 'h_blank', 'h_total',
+    'v_active', 'v_front', 'v_sync', 'v_back', 'v_blank', 'v_total',
+    'p_clock', 'actual_h_rate', 'actual_v_rate',
+)
+
+SUMS = (
+    ('h_blank', ('h_front', 'h_sync', 'h_back')),
+    ('h_total', ('h_active', 'h_blank')),
+    ('v_blank', ('v_front', 'v_sync', 'v_back')),
+    ('v_total', ('v_active', 'v_blank')),
+)
+
+
+class Infeasible(Exception):
+    pass
+
+
+def initial_ranges(fixed, interlaced=False, type=1):
+    """Ranges from the limits of type, with the fixed fields set"""
+    probe = DetailedResolution(type)
+    probe.__dict__.update(fixed)
+    probe.interlaced = bool(interlaced)
+    return {
+        'h_active': [Constants.MIN_H_ACTIVE[type], Constants.MAX_H_ACTIVE[type]],
+        'h_front': [Constants.MIN_H_FRONT[type], Constants.MAX_H_FRONT[type]],
+        'h_sync': [Constants.MIN_H_SYNC[type], Constants.MAX_H_SYNC[type]],
+        'h_back': [probe.get_min_h_back(type), probe.get_max_h_back(type)],
+        'h_blank': [probe.get_min_h_blank(type), probe.get_max_h_blank(type)],
+        'h_total': [probe.get_min_h_total(type), probe.get_max_h_total(type)],
+        'v_active': [Constants.MIN_V_ACTIVE[type], Constants.MAX_V_ACTIVE[type]],
+        'v_front': [Constants.MIN_V_FRONT[type], Constants.MAX_V_FRONT[type]],
+        'v_sync': [Constants.MIN_V_SYNC[type], Constants.MAX_V_SYNC[type]],
+        'v_back': [probe.get_min_v_back(type), probe.get_max_v_back(type)],
+        'v_blank': [probe.get_min_v_blank(type), probe.get_max_v_blank(type)],
+        'v_total': [probe.get_min_v_total(type), probe.get_max_v_total(type)],
+        'p_clock': [Constants.MIN_P_CLOCK[type], Constants.MAX_P_CLOCK[type]],
+        'actual_h_rate': [Constants.MIN_H_RATE[type], Constants.MAX_H_RATE[type]],
+        'actual_v_rate': [Constants.MIN_V_RATE[type], Constants.MAX_V_RATE[type]],
+    }
+
+
+def _narrow(ranges, field, low, high):
+    """Intersects the range of field with [low, high], returns True when it
+       changed, raises Infeasible when it becomes empty"""
+    current = ranges[field]
+    changed = False
+    if low > current[0]:
+        current[0] = low
+        changed = True
+    if high < current[1]:
+        current[1] = high
+        changed = True
+    if current[0] > current[1]:
+        raise Infeasible(field)
+    return changed
+
+
+def _propagate_sum(ranges, total, terms):
+    changed = _narrow(ranges, total,
+                      sum(ranges[term][0] for term in terms),
+                      sum(ranges[term][1] for term in terms))
+    low, high = ranges[total]
+    for term in terms:
+        others_low = sum(ranges[other][0] for other in terms if other != term)
+        others_high = sum(ranges[other][1] for other in terms if other != term)
+        changed |= _narrow(ranges, term, low - others_high, high - others_low)
+    return changed
+
+
+def _propagate_quotient(ranges, quotient, scale, divisor):
+    """quotient = p_clock * scale // divisor, divisor given as (low, high),
+       returns (changed, narrowed divisor range)"""
+    p_low, p_high = ranges['p_clock']
+    d_low, d_high = divisor
+    changed = _narrow(ranges, quotient, p_low * scale // d_high, p_high * scale // d_low)
+    q_low, q_high = ranges[quotient]
+    # q * d <= p * scale < (q + 1) * d
+    changed |= _narrow(ranges, 'p_clock', -(-q_low * d_low // scale), ((q_high + 1) * d_high - 1) // scale)
+    p_low, p_high = ranges['p_clock']
+    d_low = max(d_low, p_low * scale // (q_high + 1) + 1)
+    if q_low > 0:
+        d_high = min(d_high, p_high * scale // q_low)
+    if d_low > d_high:
+        raise Infeasible(quotient)
+    return changed, (d_low, d_high)
+
+
+def _propagate_rates(ranges, interlaced):
+    changed, (low, high) = _propagate_quotient(ranges, 'actual_h_rate', 10000, tuple(ranges['h_total']))
+    changed |= _narrow(ranges, 'h_total', low, high)
+
+    i = int(bool(interlaced))
+    h_low, h_high = ranges['h_total']
+    v_low, v_high = ranges['v_total']
+    more, (low, high) = _propagate_quotient(
+        ranges, 'actual_v_rate', 20000000, (h_low * (2 * v_low + i), h_high * (2 * v_high + i)))
+    changed |= more
+    changed |= _narrow(ranges, 'h_total', -(-low // (2 * v_high + i)), high // (2 * v_low + i))
+    h_low, h_high = ranges['h_total']
+    lines_low, lines_high = -(-low // h_high), high // h_low
+
+    # both rates come from x = p_clock * 10000 / h_total:
+    # actual_h_rate = floor(x), actual_v_rate = floor(2000 * x / lines)
+    hr_low, hr_high = ranges['actual_h_rate']
+    vr_low, vr_high = ranges['actual_v_rate']
+    lines_low = max(lines_low, 2000 * hr_low // (vr_high + 1) + 1)
+    if vr_low > 0:
+        lines_high = min(lines_high, (2000 * (hr_high + 1) - 1) // vr_low)
+    if lines_low > lines_high:
+        raise Infeasible('v_total')
+    changed |= _narrow(ranges, 'v_total', -(-(lines_low - i) // 2), (lines_high - i) // 2)
+    changed |= _narrow(ranges, 'actual_v_rate', 2000 * hr_low // lines_high,
+                       (2000 * (hr_high + 1) - 1) // lines_low)
+    changed |= _narrow(ranges, 'actual_h_rate', vr_low * lines_low // 2000,
+                       ((vr_high + 1) * lines_high - 1) // 2000)
+    return changed
+
+
+def feasible_ranges(fixed=None, p_clock=None, actual_h_rate=None, actual_v_rate=None, monitor=None,
+                    interlaced=False, type=1, max_rounds=64):
+    """dict field -> (low, high) inclusive range of every RANGE_FIELDS
+       field, None when the constraints cannot be met.
+
+       fixed maps fields to their value, p_clock, actual_h_rate and
+       actual_v_rate are (low, high) windows, monitor a monitor profile or
+       profile name.
+    """
+    fixed = dict(fixed or {})
+    ranges = initial_ranges(fixed, interlaced, type)
+    monitor = monitors.get_profile(monitor)
+    try:
+        for field, value in fixed.items():
+            _narrow(ranges, field, value, value)
+        for field, window in (('p_clock', p_clock), ('actual_h_rate', actual_h_rate),
+                              ('actual_v_rate', actual_v_rate)):
+            if window is not None:
+                _narrow(ranges, field, window[0], window[1])
+        if monitor is not None:
+            _narrow(ranges, 'p_clock', 0, monitor.max_p_clock)
+            _narrow(ranges, 'actual_h_rate', monitor.min_h_rate, monitor.max_h_rate)
+            _narrow(ranges, 'actual_v_rate', monitor.min_v_rate, monitor.max_v_rate)
+        for _ in range(max_rounds):
+            changed = False
+            for total, terms in SUMS:
+                changed |= _propagate_sum(ranges, total, terms)
+            changed |= _propagate_rates(ranges, interlaced)
+            if not changed:
+                break
+    except Infeasible as e:
+        logger.debug("No timing possible: %s range empty", e)
+        return None
+    return dict((field, tuple(ranges[field])) for field in RANGE_FIELDS)
+
+
+def resolution_ranges(detres, fields=('h_active', 'v_active'), **windows):
+    """feasible_ranges with some fields of a DetailedResolution fixed"""
+    fixed = dict((field, getattr(detres, field)) for field in fields)
+    return feasible_ranges(fixed, interlaced=detres.interlaced, type=detres.type, **windows)
+
+
+__all__ = ['RANGE_FIELDS', 'feasible_ranges', 'resolution_ranges']
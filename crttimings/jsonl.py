@@ -0,0 +1,84 @@
+"""jsonl: JSON Lines dump and load of detailed resolutions.
+
+   Each line is a JSON object holding the FIELDS of a resolution, always in
+   the FIELDS order:
+     {"h_active":640,"h_front":16,...,"v_rate_i":60000}
+
+   Lines are formatted from a template built once from FIELDS, with no
+   intermediate dict per resolution, and written to the stream in batches.
+   Loading sets the stored fields back as they are (see
+   DetailedResolution.load_dict), no update is run.
+"""
+import json
+import logging
+
+from .crttimings import DetailedResolution, TimingSnapshot, FIELDS, _get_fields
+
+logger = logging.getLogger(__name__)
+
+
+LINE_TEMPLATE = '{' + ','.join('"{}":%s'.format(field) for field in FIELDS) + '}\n'
+
+# lines joined per write
+BATCH_SIZE = 4096
+
+
+def encode_value(value):
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return repr(value)
+
+
+def dumps_line(timing):
+    """JSON line of a DetailedResolution or TimingSnapshot"""
+    return LINE_TEMPLATE % tuple(map(encode_value, _get_fields(timing)))
+
+
+def dump(timings, stream, batch_size=BATCH_SIZE):
+    """Writes one line per DetailedResolution or TimingSnapshot to
+       a text stream, returns the number of lines written"""
+    batch = []
+    count = 0
+    for timing in timings:
+        batch.append(LINE_TEMPLATE % tuple(map(encode_value, _get_fields(timing))))
+        if len(batch) == batch_size:
+            stream.write(''.join(batch))
+            count += len(batch)
+            batch = []
+    if batch:
+        stream.write(''.join(batch))
+        count += len(batch)
+    return count
+
+
+def iter_load_dicts(stream):
+    """Yields the dict of every non empty line of a text stream"""
+    decode = json.JSONDecoder().decode
+    for line in stream:
+        if line.strip():
+            yield decode(line)
+
+
+def iter_load(stream, type=1):
+    """Yields a DetailedResolution for every line of a text stream"""
+    for values in iter_load_dicts(stream):
+        detres = DetailedResolution(type)
+        detres.load_dict(values)
+        yield detres
+
+
+def iter_load_snapshots(stream):
+    """Yields a TimingSnapshot for every line of a text stream"""
+    for values in iter_load_dicts(stream):
+        yield TimingSnapshot(**values)
+
+
+def dump_path(timings, path, buffer_size=1 << 20):
+    with open(path, 'w', buffering=buffer_size) as stream:
+        return dump(timings, stream)
+
+
+__all__ = ['LINE_TEMPLATE', 'dumps_line', 'dump', 'dump_path', 'iter_load', 'iter_load_dicts',
+           'iter_load_snapshots']
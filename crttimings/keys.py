@@ -0,0 +1,172 @@
+"""keys: canonical integer keys of timings, for deduplication.
+
+   The key of a timing packs its defining fields (the TimingRecord ones but
+   native) into one integer, each field on the bit width of its type 1
+   maximum, most significant first:
+     h_active h_front h_sync h_back v_active v_front v_sync v_back p_clock
+     h_polarity v_polarity interlaced
+   Derived fields (blanking, totals, rates) are left out: two timings share
+   a key exactly when they drive a display the same way. Keys fit in
+   KEY_BYTES bytes (big endian, so byte order is key order).
+
+   UniqueTimings keeps the keys of the timings it was given: recent keys in
+   a set, older ones in sorted bytes buffers of KEY_BYTES per key (runs).
+   Each compaction turns the set into a new run, merged with the smaller
+   runs only (each run is at least twice as long as the next one), so a
+   key is merged O(log(N / max_pending)) times over a stream of N keys and
+   a lookup bisects O(log(N / max_pending)) runs.
+"""
+import bisect
+import heapq
+import logging
+
+from .constants import Constants
+from .crttimings import TimingRecord
+
+logger = logging.getLogger(__name__)
+
+
+KEY_FIELDS = (
+    ('h_active', Constants.MAX_H_ACTIVE[1]),
+    ('h_front', Constants.MAX_H_FRONT[1]),
+    ('h_sync', Constants.MAX_H_SYNC[1]),
+    ('h_back', Constants.MAX_H_BACK[1]),
+    ('v_active', Constants.MAX_V_ACTIVE[1]),
+    ('v_front', Constants.MAX_V_FRONT[1]),
+    ('v_sync', Constants.MAX_V_SYNC[1]),
+    ('v_back', Constants.MAX_V_BACK[1]),
+    ('p_clock', Constants.MAX_P_CLOCK[1]),
+)
+KEY_FLAGS = ('h_polarity', 'v_polarity', 'interlaced')
+KEY_WIDTHS = tuple(maximum.bit_length() for field, maximum in KEY_FIELDS)
+KEY_BITS = sum(KEY_WIDTHS) + len(KEY_FLAGS)
+KEY_BYTES = (KEY_BITS + 7) // 8
+
+# keys kept in the set before being merged into the sorted buffer
+MAX_PENDING = 1 << 20
+
+
+def timing_key(timing):
+    """Key of a DetailedResolution, TimingSnapshot or TimingRecord,
+       ValueError when a field is out of its type 1 range"""
+    key = 0
+    for (field, maximum), width in zip(KEY_FIELDS, KEY_WIDTHS):
+        value = int(getattr(timing, field))
+        if not 0 <= value <= maximum:
+            raise ValueError("{} = {} cannot be keyed".format(field, value))
+        key = key << width | value
+    for field in KEY_FLAGS:
+        key = key << 1 | bool(getattr(timing, field))
+    return key
+
+
+def key_record(key):
+    """TimingRecord of a key (native False)"""
+    flags = []
+    for field in reversed(KEY_FLAGS):
+        flags.append(bool(key & 1))
+        key >>= 1
+    values = []
+    for width in reversed(KEY_WIDTHS):
+        values.append(key & ((1 << width) - 1))
+        key >>= width
+    values.reverse()
+    h_polarity, v_polarity, interlaced = reversed(flags)
+    return TimingRecord(*values + [h_polarity, v_polarity, interlaced, False])
+
+
+def key_bytes(key):
+    return key.to_bytes(KEY_BYTES, 'big')
+
+
+class SortedKeys(object):
+    """Read only sequence of the keys held in a sorted bytes buffer"""
+    def __init__(self, buf=b''):
+        self.buf = buf
+
+    def __len__(self):
+        return len(self.buf) // KEY_BYTES
+
+    def __getitem__(self, index):
+        start = index * KEY_BYTES
+        return int.from_bytes(self.buf[start:start + KEY_BYTES], 'big')
+
+    def __iter__(self):
+        for start in range(0, len(self.buf), KEY_BYTES):
+            yield int.from_bytes(self.buf[start:start + KEY_BYTES], 'big')
+
+    def __contains__(self, key):
+        i = bisect.bisect_left(self, key)
+        return i < len(self) and self[i] == key
+
+    def iter_bytes(self):
+        """Keys as KEY_BYTES bytes, which sort as the keys do"""
+        buf = self.buf
+        for start in range(0, len(buf), KEY_BYTES):
+            yield buf[start:start + KEY_BYTES]
+
+    def merge(self, other):
+        """SortedKeys of the keys of self and other (disjoint)"""
+        return SortedKeys(b''.join(heapq.merge(self.iter_bytes(), other.iter_bytes())))
+
+
+class UniqueTimings(object):
+    """Collects the distinct timings (by key) among the ones added"""
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending = set()
+        # SortedKeys, longest first
+        self.runs = []
+        self.seen = 0
+
+    def __len__(self):
+        return len(self.pending) + sum(len(run) for run in self.runs)
+
+    def __contains__(self, timing):
+        return self.known(timing_key(timing))
+
+    def known(self, key):
+        return key in self.pending or any(key in run for run in self.runs)
+
+    def add_key(self, key):
+        """Adds a key, returns True when it was not known"""
+        self.seen += 1
+        if self.known(key):
+            return False
+        self.pending.add(key)
+        if len(self.pending) >= self.max_pending:
+            self.compact()
+        return True
+
+    def add(self, timing):
+        """Adds a timing, returns True when it was not known"""
+        return self.add_key(timing_key(timing))
+
+    def update(self, timings):
+        """Adds timings, returns how many were not known"""
+        return sum(self.add_key(timing_key(timing)) for timing in timings)
+
+    def compact(self):
+        """Turns the pending keys into a run, merged with the runs that are
+           not at least twice as long"""
+        if not self.pending:
+            return
+        run = SortedKeys(b''.join(key.to_bytes(KEY_BYTES, 'big') for key in sorted(self.pending)))
+        self.pending = set()
+        while self.runs and len(self.runs[-1]) < 2 * len(run):
+            run = self.runs.pop().merge(run)
+        self.runs.append(run)
+        logger.debug("%s unique keys in %s runs out of %s", len(self), len(self.runs), self.seen)
+
+    def keys(self):
+        """Sorted keys"""
+        self.compact()
+        return heapq.merge(*self.runs)
+
+    def __iter__(self):
+        """TimingRecord of every unique timing, in key order"""
+        for key in self.keys():
+            yield key_record(key)
+
+
+__all__ = ['KEY_BITS', 'KEY_BYTES', 'timing_key', 'key_record', 'key_bytes', 'SortedKeys', 'UniqueTimings']
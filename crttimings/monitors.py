@@ -0,0 +1,57 @@
+"""monitors: range limits published by real displays.
+
+   A profile bounds the horizontal rate (Hz), the vertical rate (1/1000 Hz)
+   and the pixel clock (10 kHz) a display accepts. Profiles are looked up by
+   name among Constants.MONITOR_PROFILES or built directly.
+
+   may_admit() tells from the requested mode alone (before any timing is
+   computed) whether a display could show it, using the smallest blanking
+   the limits allow, so searches can skip modes no timing can fit.
+"""
+import collections
+
+from .constants import Constants
+
+MonitorProfile = collections.namedtuple('MonitorProfile', [
+    'name', 'min_h_rate', 'max_h_rate', 'min_v_rate', 'max_v_rate', 'max_p_clock',
+])
+
+PROFILES = dict((profile[0], MonitorProfile(*profile)) for profile in Constants.MONITOR_PROFILES)
+
+# tolerance of the pruning bounds for the rounding of actual rates
+SLACK = 0.99
+
+
+def get_profile(profile):
+    """MonitorProfile for a profile or a profile name, None for None"""
+    if profile is None or isinstance(profile, MonitorProfile):
+        return profile
+    return PROFILES[profile]
+
+
+def admits(profile, actual_h_rate, actual_v_rate, p_clock):
+    return (profile.min_h_rate <= actual_h_rate <= profile.max_h_rate and
+            profile.min_v_rate <= actual_v_rate <= profile.max_v_rate and
+            p_clock <= profile.max_p_clock)
+
+
+def admits_resolution(profile, detres):
+    return admits(profile, detres.actual_h_rate, detres.actual_v_rate, detres.p_clock)
+
+
+def may_admit(profile, h_active, v_active, v_rate, interlaced=False, type=1):
+    """False when no timing of this mode can fit within the profile"""
+    if not profile.min_v_rate * SLACK <= v_rate <= profile.max_v_rate / SLACK:
+        return False
+    v_total = v_active + Constants.MIN_V_BLANK[type]
+    if interlaced:
+        min_h_rate = v_rate * (2 * v_total + 1) // 2000
+    else:
+        min_h_rate = v_rate * v_total // 1000
+    if min_h_rate * SLACK > profile.max_h_rate:
+        return False
+    min_p_clock = min_h_rate * (h_active + Constants.MIN_H_BLANK[type]) // 10000
+    return min_p_clock * SLACK <= profile.max_p_clock
+
+
+__all__ = ['MonitorProfile', 'PROFILES', 'get_profile', 'admits', 'admits_resolution', 'may_admit']
@@ -1,13 +1,127 @@
 from opere import opere
+import collections
+import functools
 import logging
+import math
+
+from . import intervals, monitors, rpi
+from .crttimings import PORCHES, Sensitivity
 
 logger = logging.getLogger(__name__)
 
 
+class SolvedModes(object):
+    """Session cache of the modes solved by OpereTVResolution searches
+       sharing it, used to start new searches close to a solution (warm
+       start).
+
+       seed() copies the porches of the nearest solved mode (same scan
+       type, closest active size, refresh rate and pixel clock, in ratios)
+       to a resolution: horizontal porches are scaled to its width, then
+       vertical ones so that the pixel clock computed from its refresh rate
+       lands near the goal. Only the last max_modes solutions are kept.
+    """
+    def __init__(self, max_modes=4096):
+        self.max_modes = max_modes
+        self.modes = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.modes)
+
+    def add(self, obj):
+        """Records the current timing of obj as a solution"""
+        timing = obj.snapshot()
+        key = (timing.h_active, timing.v_active, timing.v_rate, timing.interlaced, timing.p_clock)
+        self.modes.pop(key, None)
+        self.modes[key] = timing
+        if len(self.modes) > self.max_modes:
+            self.modes.popitem(last=False)
+
+    @staticmethod
+    def distance(timing, obj, pixel_clock):
+        return (abs(math.log(obj.h_active / timing.h_active)) +
+                abs(math.log(obj.v_active / timing.v_active)) +
+                abs(math.log(obj.v_rate / timing.v_rate)) +
+                abs(math.log(pixel_clock / timing.p_clock)))
+
+    def nearest(self, obj, pixel_clock):
+        """Solved TimingSnapshot closest to obj searched for pixel_clock, None when
+           there is none of its scan type"""
+        if min(obj.h_active, obj.v_active, obj.v_rate, pixel_clock) <= 0:
+            return None
+        candidates = [timing for timing in self.modes.values() if timing.interlaced == obj.interlaced]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda timing: self.distance(timing, obj, pixel_clock))
+
+    def seed(self, obj, pixel_clock, porches, floors):
+        """Sets the porches of obj from the nearest solution, on the porches
+           grid and above floors, returns that solution or None"""
+        timing = self.nearest(obj, pixel_clock)
+        if timing is None:
+            return None
+        grids = dict(porches)
+        values = {}
+        ratio = obj.h_active / timing.h_active
+        for porch in ('h_front', 'h_sync', 'h_back'):
+            values[porch] = max(int(round(getattr(timing, porch) * ratio / grids[porch])) * grids[porch],
+                                floors[porch])
+        v_porches = ('v_front', 'v_sync', 'v_back')
+        for porch in v_porches:
+            values[porch] = max(getattr(timing, porch), floors[porch])
+        if obj.last_rate == 0:
+            # p_clock ~ v_rate * h_total * lines, lines = 2 * v_total + interlaced
+            h_total = obj.h_active + values['h_front'] + values['h_sync'] + values['h_back']
+            i = int(bool(obj.interlaced))
+            lines = ((2 * timing.v_total + i) * pixel_clock / timing.p_clock *
+                     timing.h_total / h_total * timing.v_rate / obj.v_rate)
+            v_blank = (lines - i) / 2 - obj.v_active
+            ratio = v_blank / timing.v_blank if timing.v_blank > 0 else 1
+            for porch in v_porches[:-1]:
+                values[porch] = max(int(round(getattr(timing, porch) * ratio)), floors[porch])
+            values['v_back'] = max(int(round(v_blank)) - values['v_front'] - values['v_sync'], floors['v_back'])
+        with obj.batch():
+            for porch in PORCHES:
+                if getattr(obj, porch) != values[porch]:
+                    getattr(obj, 'set_' + porch)(values[porch])
+        return timing
+
+
 class OpereTVResolution(opere.Opere):
+    # porches changed by moves, with their step (horizontal values stay on
+    # the 8 pixel grid)
+    porches = (
+        ('h_front', 8),
+        ('h_sync', 8),
+        ('h_back', 8),
+        ('v_front', 1),
+        ('v_sync', 1),
+        ('v_back', 1),
+    )
+    # relative margin of the held rate window in feasible_ranges
+    rate_tolerance = 0.02
+    # fields telling the states of a search apart (see Opere.state_key)
+    state_fields = PORCHES + ('p_clock',)
+    # lowest value the steps leave each porch at
+    porch_floors = {
+        'h_front': 8,
+        'h_sync': 8,
+        'h_back': 8,
+        'v_front': 3,
+        'v_sync': 3,
+        'v_back': 3,
+    }
 
-    def __init__(self, pixel_clock=960, h_rate=15, h_active=600, max_steps=20000):
-        super(OpereTVResolution, self).__init__(max_steps)
+    def __init__(self, pixel_clock=960, h_rate=15, h_active=600, max_steps=20000, strategy=None, seed=None,
+                 adaptive=False, max_step_factor=64, cycle_policy='shrink', monitor=None,
+                 clock_table=None, goals=(), session=None):
+        super(OpereTVResolution, self).__init__(max_steps, strategy, seed, cycle_policy)
+        # adaptive steps: each step doubles its amount while the pixel clock
+        # stays on the same side of the goal and halves it when it crosses
+        self.adaptive = adaptive
+        self.max_step_factor = max_step_factor
+        self.step_factors = {}
+        self.step_signs = {}
         self.pixel_clock = pixel_clock
         self.h_rate = h_rate
         self.h_active = h_active
@@ -25,95 +139,259 @@ class OpereTVResolution(opere.Opere):
             self.step_v_back_less,
             self.step_v_sync_less
                 ]
+        self.moves = [
+            functools.partial(self.move, field=field, delta=delta * sign)
+            for field, delta in self.porches
+            for sign in (1, -1)
+        ]
+        # range limits of the target display, hard bounds of the search
+        self.monitor = monitors.get_profile(monitor)
+        if self.monitor is not None:
+            self.constraints.append(self.within_monitor)
+        # clocks the target board can produce (rpi.ClockTable or board
+        # name): the goal is snapped to it and only reached on one of them
+        self.clock_table = rpi.clock_table(clock_table)
+        if self.clock_table is not None:
+            self.pixel_clock = self.clock_table.snap(self.pixel_clock)
+            self.steps.insert(0, self.step_snap_p_clock)
+        self.pixel_clock_spec = opere.GoalSpec('p_clock', self.pixel_clock, 0.02)
+        self.within_pixel_clock = opere.compile_goal(self.pixel_clock_spec)
+        self.within_h_rate = opere.compile_goal(opere.GoalSpec('h_rate', self.h_rate, 0.05))
+        self.within_h_active = opere.compile_goal(opere.GoalSpec('h_active', self.h_active, 0.05))
+        # extra GoalSpecs
+        self.add_goals(goals)
+        # SolvedModes shared by searches: each call starts from the nearest
+        # solution and adds its own
+        self.session = session
 
-    def goal_pixel_clock(self, obj):
-        goal = self.pixel_clock
-        if obj.p_clock < goal - (0.02 * goal):
-            direction = obj.p_clock - goal - (0.02 * goal)
-        elif obj.p_clock > goal + (0.02 * goal):
-            direction = obj.p_clock - (goal + (0.02 * goal))
-        else:
-            direction = 0
-        return direction
+    def call(self, obj, strategy=None):
+        self.step_factors = {}
+        self.step_signs = {}
+        if self.feasible_ranges(obj) is None:
+            logger.info("No timing of %sx%s reaches the goals", obj.h_active, obj.v_active)
+            self.effort = opere.Effort(opere.get_strategy(strategy or self.strategy).name, 0, 0, 0, 0, False)
+            return False
+        if self.session is not None:
+            self.warm_start(obj)
+        reached = super(OpereTVResolution, self).call(obj, strategy)
+        if reached and self.session is not None:
+            self.session.add(obj)
+        return reached
 
-    def goal_h_rate(self, obj):
-        goal = self.h_rate
-        if obj.h_rate < goal - (0.05 * goal):
-            direction = -1
-        elif obj.h_rate > goal + (0.05 * goal):
-            direction = 1
-        else:
-            direction = 0
-        return direction
+    def warm_start(self, obj):
+        """Seeds the porches of obj from the session, unless that takes it
+           out of the monitor limits. Returns the solution used, or None"""
+        seeded = []
 
-    def goal_h_active(self, obj):
-        goal = self.h_active
-        if obj.h_active < goal - (0.05 * goal):
-            direction = -1
-        elif obj.p_clock > goal + (0.05 * goal):
-            direction = 1
-        else:
-            direction = 0
-        return direction
+        def step(obj):
+            seeded.append(self.session.seed(obj, self.pixel_clock, self.porches, self.porch_floors))
+        if not self.apply(obj, step) or seeded[0] is None:
+            return None
+        timing = seeded[0]
+        logger.info("Warm start of %sx%s from %sx%s", obj.h_active, obj.v_active, timing.h_active, timing.v_active)
+        return timing
 
-    def step_h_front_less(self, obj):
+    def feasible_ranges(self, obj):
+        """Field ranges (see intervals.feasible_ranges) left by the active
+           size of obj, the pixel clock goal, the rate obj holds (v_rate or
+           h_rate, see last_rate, within rate_tolerance) and the monitor,
+           None when the search cannot succeed"""
+        low, high = opere.goal_window(self.pixel_clock_spec)
+        windows = {'p_clock': (int(math.ceil(low)), int(high))}
+        held = {0: ('actual_v_rate', obj.v_rate), 1: ('actual_h_rate', obj.h_rate)}.get(obj.last_rate)
+        if held is not None and held[1] > 0:
+            field, rate = held
+            margin = rate * self.rate_tolerance
+            windows[field] = (int(math.floor(rate - margin)), int(math.ceil(rate + margin)))
+        return intervals.resolution_ranges(obj, monitor=self.monitor, **windows)
+
+    def next_value(self, field, value, grid, floor):
+        """Value of a porch after a step: moved by grid units against the
+           pixel clock goal (porches grow when the clock is too low), not
+           going under floor"""
         if self.goals_states[self.goal_pixel_clock] < 0:
             direction = -1
         else:
             direction = 1
+        factor = 1
+        if self.adaptive:
+            last = self.step_signs.get(field)
+            factor = self.step_factors.get(field, 1)
+            if last == direction:
+                factor = min(factor * 2, self.max_step_factor)
+            elif last is not None:
+                factor = max(factor // 2, 1)
+            self.step_factors[field] = factor
+            self.step_signs[field] = direction
+        return max(value - grid * factor * direction, floor)
+
+    def shrink_steps(self):
+        """Halves the adaptive step amounts"""
+        shrunk = False
+        for field, factor in self.step_factors.items():
+            if factor > 1:
+                self.step_factors[field] = factor // 2
+                shrunk = True
+        return shrunk
+
+    def newton_specs(self):
+        """GoalSpecs on the pixel clock or actual rates, solved in this
+           order by the Newton strategy"""
+        return [self.pixel_clock_spec] + [
+            goal.spec for goal in self.goals
+            if getattr(goal, 'spec', None) is not None and goal.spec.field in Sensitivity._fields]
+
+    def move(self, obj, field, delta):
+        """Changes a porch by delta, keeping it above 1"""
+        value = getattr(obj, field) + delta
+        if value >= 1:
+            getattr(obj, 'set_' + field)(value)
+
+    def within_monitor(self, obj):
+        return monitors.admits_resolution(self.monitor, obj)
 
+    def goal_pixel_clock(self, obj):
+        direction = self.within_pixel_clock(obj)
+        if direction == 0 and self.clock_table is not None and obj.p_clock not in self.clock_table:
+            direction = obj.p_clock - self.clock_table.snap(obj.p_clock)
+        return direction
+
+    def step_snap_p_clock(self, obj):
+        """Moves a pixel clock within the goal range to the nearest
+           achievable one of that range"""
+        low, high = opere.goal_window(self.pixel_clock_spec)
+        if low <= obj.p_clock <= high and obj.p_clock not in self.clock_table:
+            clocks = self.clock_table.within(int(math.ceil(low)), int(high))
+            if clocks:
+                obj.set_p_clock(min(clocks, key=lambda clock: abs(clock - obj.p_clock)))
+
+    def goal_h_rate(self, obj):
+        return self.within_h_rate(obj)
+
+    def goal_h_active(self, obj):
+        return self.within_h_active(obj)
+
+    def step_h_front_less(self, obj):
         if obj.h_front > 8 and min(
                 obj.h_front, obj.h_sync, obj.h_back) != obj.h_front:
-            obj.set_h_front(obj.h_front - 8 * direction)
+            obj.set_h_front(self.next_value('h_front', obj.h_front, 8, 8))
 
     def step_h_sync_less(self, obj):
-        if self.goals_states[self.goal_pixel_clock] < 0:
-            direction = -1
-        else:
-            direction = 1
-
         if obj.h_sync > 8 and min(
                 obj.h_front, obj.h_sync, obj.h_back) != obj.h_sync:
-            obj.set_h_sync(obj.h_sync - 8 * direction)
+            obj.set_h_sync(self.next_value('h_sync', obj.h_sync, 8, 8))
 
     def step_h_back_less(self, obj):
-        if self.goals_states[self.goal_pixel_clock] < 0:
-            direction = -1
-        else:
-            direction = 1
-
         if obj.h_back > 8 and min(
                 obj.h_front, obj.h_sync, obj.h_back) != obj.h_back:
-            obj.set_h_back(obj.h_back - 8 * direction)
+            obj.set_h_back(self.next_value('h_back', obj.h_back, 8, 8))
 
     def step_v_front_less(self, obj):
-        if self.goals_states[self.goal_pixel_clock] < 0:
-            direction = -1
-        else:
-            direction = 1
-
         if obj.v_front > 3 and min(
                 obj.v_sync, obj.v_front, obj.v_back) != obj.v_front:
-            obj.v_front -= 1
-            obj.set_v_front(obj.v_front - 1 * direction)
+            obj.set_v_front(self.next_value('v_front', obj.v_front, 1, 3))
 
     def step_v_sync_less(self, obj):
-        if self.goals_states[self.goal_pixel_clock] < 0:
-            direction = -1
-        else:
-            direction = 1
-
         if obj.v_sync > 3 and min(
                 obj.v_sync, obj.v_front, obj.v_back) != obj.v_sync:
-            obj.set_v_sync(obj.v_sync - 1 * direction)
+            obj.set_v_sync(self.next_value('v_sync', obj.v_sync, 1, 3))
 
     def step_v_back_less(self, obj):
-        if self.goals_states[self.goal_pixel_clock] < 0:
-            direction = -1
-        else:
-            direction = 1
-
         if obj.v_back > 3 and min(
                 obj.v_sync, obj.v_front, obj.v_back) != obj.v_back:
-            obj.set_v_back(obj.v_back - 1 * direction)
+            obj.set_v_back(self.next_value('v_back', obj.v_back, 1, 3))
+
+
+
+class Newton(opere.Strategy):
+    """Moves straight to the goals using DetailedResolution.sensitivity.
+
+       With two GoalSpecs or more (see newton_specs), the first two are
+       solved together for a change of one horizontal and one vertical
+       porch (the linear system of their sensitivities). Otherwise, or when
+       that system is singular, the porch with the largest effect on the
+       first unreached spec is changed by the amount bringing its field to
+       the target. Changes are rounded to the porch grid. When no change
+       applies or a state comes back, the greedy strategy takes over with
+       the steps left, also settling what the specs do not cover (clock
+       table).
+    """
+    name = 'newton'
+
+    def run(self, search, obj):
+        detector = opere.CycleDetector(search.cycle_window)
+        detector.push(search.state_key(obj))
+        while search.steps_left > 0:
+            search.evaluate(obj)
+            if search.reached():
+                return True
+            if not self.newton_step(search, obj):
+                break
+            search.steps_left -= 1
+            if detector.push(search.state_key(obj)):
+                search.cycles += 1
+                break
+        return opere.Greedy(self.seed).run(search, obj)
+
+    def newton_step(self, search, obj):
+        """Applies one Newton change, returns False when none applies"""
+        sensitivity = obj.sensitivity()
+        if sensitivity is None:
+            return False
+        specs = search.newton_specs()
+        unreached = [spec for spec in specs if not self.within(obj, spec)]
+        if not unreached:
+            return False
+        if len(specs) >= 2 and self.joint_step(search, obj, sensitivity, specs[0], specs[1]):
+            return True
+        return self.single_step(search, obj, sensitivity, unreached[0])
+
+    @staticmethod
+    def within(obj, spec):
+        low, high = opere.goal_window(spec)
+        return low <= getattr(obj, spec.field) <= high
+
+    def porch_change(self, search, obj, porch, delta):
+        """Change of porch closest to delta on its grid, above its floor"""
+        grid = dict(search.porches)[porch]
+        current = getattr(obj, porch)
+        return max(current + int(round(delta / grid)) * grid, search.porch_floors[porch]) - current
+
+    def joint_step(self, search, obj, sensitivity, first, second):
+        # the porches with the most room move: back porches grow, the
+        # largest porch shrinks
+        slopes = [[getattr(sensitivity[porch], spec.field) for porch in ('h_back', 'v_back')]
+                  for spec in (first, second)]
+        det = slopes[0][0] * slopes[1][1] - slopes[0][1] * slopes[1][0]
+        if not det:
+            return False
+        errors = [spec.target - getattr(obj, spec.field) for spec in (first, second)]
+        h = (errors[0] * slopes[1][1] - errors[1] * slopes[0][1]) / det
+        v = (slopes[0][0] * errors[1] - slopes[1][0] * errors[0]) / det
+        changes = []
+        for delta, porches in ((h, ('h_front', 'h_sync', 'h_back')), (v, ('v_front', 'v_sync', 'v_back'))):
+            porch = porches[-1] if delta > 0 else max(porches, key=lambda p: getattr(obj, p))
+            change = self.porch_change(search, obj, porch, delta)
+            if change:
+                changes.append((porch, change))
+        if not changes:
+            return False
+
+        def step(obj):
+            for porch, change in changes:
+                search.move(obj, porch, change)
+        return search.apply(obj, step)
+
+    def single_step(self, search, obj, sensitivity, spec):
+        error = spec.target - getattr(obj, spec.field)
+        slopes = [(abs(getattr(sensitivity[porch], spec.field)), porch) for porch in PORCHES]
+        for slope, porch in sorted(slopes, reverse=True):
+            if not slope:
+                break
+            change = self.porch_change(search, obj, porch, error / getattr(sensitivity[porch], spec.field))
+            if change and search.apply(obj, functools.partial(search.move, field=porch, delta=change)):
+                return True
+        return False
+
 
+opere.STRATEGIES[Newton.name] = Newton
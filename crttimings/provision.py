@@ -0,0 +1,166 @@
+"""provision: write hdmi_timings config fragments for a fleet of devices.
+
+   The inventory is a CSV file with a header row and the columns:
+     device       name of the device, used as the fragment file name
+     display      display model (informational)
+     h_active     horizontal resolution in pixels
+     v_active     vertical resolution in lines (per field when interlaced)
+     v_rate       refresh rate in Hz (59.94, 60, ...)
+     interlaced   0/1, optional
+     timing       timing standard index (see timing_texts), optional
+     pixel_clock  target pixel clock in MHz, optional; when set the timings
+                  are searched with OpereTVResolution, modes whose search
+                  does not reach it are not provisioned
+     monitor      monitor profile name (see monitors.PROFILES), optional;
+                  modes out of its range limits are not provisioned
+     board        Raspberry Pi board (see rpi.BOARDS), optional; the pixel
+                  clock is snapped to one the board can produce
+
+   Rows asking for the same mode share one computation: unique modes are
+   computed once, spread over a process pool, and the result is written to
+   every device that asked for it.
+
+   Usage:
+     provision <inventory> <outdir> [--processes=<n>]
+
+   Options:
+     --processes=<n>  Number of worker processes [default: all cores]
+"""
+import collections
+import csv
+import logging
+import multiprocessing
+import os
+
+from . import crttimings, formats, monitors, opere, rpi
+
+logger = logging.getLogger(__name__)
+
+
+ModeRequest = collections.namedtuple(
+    'ModeRequest',
+    ['h_active', 'v_active', 'v_rate', 'interlaced', 'timing', 'pixel_clock', 'monitor', 'board'])
+
+
+def _flag(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'i')
+
+
+def mode_request_from_row(row):
+    """ModeRequest for an inventory row, rates in the units used by
+       DetailedResolution (1/1000 Hz, 10 kHz)"""
+    pixel_clock = (row.get('pixel_clock') or '').strip()
+    timing = (row.get('timing') or '').strip()
+    monitor = (row.get('monitor') or '').strip()
+    board = (row.get('board') or '').strip()
+    return ModeRequest(
+        h_active=int(row['h_active']),
+        v_active=int(row['v_active']),
+        v_rate=int(round(float(row['v_rate']) * 1000)),
+        interlaced=_flag(row.get('interlaced') or '0'),
+        timing=int(timing) if timing else 4,
+        pixel_clock=int(round(float(pixel_clock) * 100)) if pixel_clock else None,
+        monitor=monitor or None,
+        board=board or None,
+    )
+
+
+def read_inventory(stream):
+    """Yields (device, ModeRequest) for every row of an inventory"""
+    for row in csv.DictReader(stream):
+        yield row['device'].strip(), mode_request_from_row(row)
+
+
+def compute_mode(request):
+    """Computes one mode, returns (request, config fragment or None)"""
+    try:
+        monitor = monitors.get_profile(request.monitor)
+        if monitor is not None and not monitors.may_admit(
+                monitor, request.h_active, request.v_active, request.v_rate, request.interlaced):
+            logger.info("%s out of the %s range limits", request, monitor.name)
+            return request, None
+        detres = crttimings.detailed_resolution_for(
+            request.h_active, request.v_active, request.v_rate,
+            request.interlaced, request.timing)
+        detres.set_monitor(monitor)
+        clocks = rpi.clock_table(request.board)
+        if request.pixel_clock is not None:
+            detres.set_timing(0)
+            search = opere.OpereTVResolution(
+                pixel_clock=request.pixel_clock, h_active=request.h_active, monitor=monitor,
+                clock_table=clocks)
+            if not search.call(detres):
+                logger.info("%s pixel clock not reached", request)
+                return request, None
+        elif clocks is not None and detres.p_clock not in clocks:
+            if not clocks.covers(detres.p_clock):
+                logger.info("%s pixel clock out of the %s range", request, request.board)
+                return request, None
+            detres.set_timing(0)
+            detres.set_p_clock(clocks.snap(detres.p_clock))
+        if not detres.is_valid_rate():
+            return request, None
+        return request, formats.hdmi_config_fragment(detres)
+    except Exception:
+        logger.exception("Could not compute %s", request)
+        return request, None
+
+
+def compute_modes(requests, processes=None):
+    """Computes each distinct request once over a process pool and returns
+       a dict request -> config fragment (None when no timing was found)"""
+    unique = list(collections.OrderedDict.fromkeys(requests))
+    logger.info("Computing %s unique modes", len(unique))
+    pool = multiprocessing.Pool(processes)
+    try:
+        chunksize = max(1, len(unique) // (4 * (processes or os.cpu_count() or 1)))
+        return dict(pool.imap_unordered(compute_mode, unique, chunksize))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def fragment_path(outdir, device):
+    return os.path.join(outdir, device.replace(os.sep, '_') + '.txt')
+
+
+def provision(inventory, outdir, processes=None):
+    """Writes one config fragment per inventory device into outdir, returns
+       the list of devices for which no timing could be computed"""
+    with open(inventory, newline='') as stream:
+        devices = list(read_inventory(stream))
+    logger.info("Read %s devices", len(devices))
+    fragments = compute_modes((request for device, request in devices), processes)
+
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    failed = []
+    for device, request in devices:
+        fragment = fragments[request]
+        if fragment is None:
+            failed.append(device)
+            continue
+        with open(fragment_path(outdir, device), 'w') as f:
+            f.write(fragment)
+    if failed:
+        logger.warning("No timings for %s devices", len(failed))
+    return failed
+
+
+def main(argv=None):
+    import docopt
+
+    args = docopt.docopt(__doc__, argv)
+    processes = args['--processes']
+    processes = None if processes == 'all cores' else int(processes)
+    failed = provision(args['<inventory>'], args['<outdir>'], processes)
+    for device in failed:
+        print(device)
+    return 1 if failed else 0
+
+
+__all__ = ['ModeRequest', 'read_inventory', 'compute_mode', 'compute_modes', 'provision']
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
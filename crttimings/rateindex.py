@@ -0,0 +1,117 @@
+"""rateindex: find the modes a display can be driven with from a rate window.
+
+   The index is built once over a grid of h_active x v_active x v_rate x
+   scan type, then answers questions such as "which modes give a horizontal
+   rate between 15.625 and 15.734 kHz" with binary searches.
+
+   Units are the ones of DetailedResolution: actual_h_rate in Hz,
+   actual_v_rate and v_rate in 1/1000 Hz, p_clock in 10 kHz.
+"""
+import array
+import bisect
+import collections
+import itertools
+import logging
+
+from .constants import Constants
+from . import crttimings, monitors
+
+logger = logging.getLogger(__name__)
+
+
+IndexedMode = collections.namedtuple('IndexedMode', [
+    'h_active', 'v_active', 'v_rate', 'interlaced',
+    'actual_h_rate', 'actual_v_rate', 'p_clock',
+])
+
+
+class RateIndex(object):
+    """Modes stored column by column, with one sorted copy of each
+       searchable column and the permutation leading back to the modes"""
+    columns = IndexedMode._fields
+    keys = ('actual_h_rate', 'actual_v_rate', 'p_clock')
+
+    def __init__(self, modes=()):
+        self.data = dict((column, array.array('q')) for column in self.columns)
+        for mode in modes:
+            for column, value in zip(self.columns, mode):
+                self.data[column].append(int(value))
+        self.sorted_values = {}
+        self.sorted_modes = {}
+        for key in self.keys:
+            values = self.data[key]
+            order = sorted(range(len(values)), key=values.__getitem__)
+            self.sorted_modes[key] = array.array('q', order)
+            self.sorted_values[key] = array.array('q', (values[i] for i in order))
+
+    def __len__(self):
+        return len(self.data['p_clock'])
+
+    def mode(self, index):
+        return IndexedMode(*[
+            bool(self.data[column][index]) if column == 'interlaced' else self.data[column][index]
+            for column in self.columns])
+
+    def span(self, key, low, high):
+        """(start, end) positions of the values within [low, high] in the
+           sorted column key"""
+        values = self.sorted_values[key]
+        return bisect.bisect_left(values, low), bisect.bisect_right(values, high)
+
+    def query(self, actual_h_rate=None, actual_v_rate=None, p_clock=None):
+        """IndexedMode list of the modes within every given (low, high)
+           inclusive window, the narrowest window is searched first"""
+        windows = dict((key, window) for key, window in (
+            ('actual_h_rate', actual_h_rate),
+            ('actual_v_rate', actual_v_rate),
+            ('p_clock', p_clock),
+        ) if window is not None)
+        if not windows:
+            return [self.mode(i) for i in range(len(self))]
+
+        spans = dict((key, self.span(key, *window)) for key, window in windows.items())
+        key = min(spans, key=lambda k: spans[k][1] - spans[k][0])
+        start, end = spans[key]
+        others = [(self.data[k], windows[k][0], windows[k][1]) for k in windows if k != key]
+        found = []
+        for i in self.sorted_modes[key][start:end]:
+            if all(low <= column[i] <= high for column, low, high in others):
+                found.append(self.mode(i))
+        return found
+
+
+def compute_indexed_mode(h_active, v_active, v_rate, interlaced, timing=4):
+    """IndexedMode for a grid point, None when the standard has no timing"""
+    detres = crttimings.detailed_resolution_for(h_active, v_active, v_rate, interlaced, timing)
+    if Constants.BLANK in (detres.actual_h_rate, detres.actual_v_rate, detres.p_clock):
+        return None
+    return IndexedMode(h_active, v_active, v_rate, bool(interlaced),
+                       detres.actual_h_rate, detres.actual_v_rate, detres.p_clock)
+
+
+def build_rate_index(h_actives, v_actives, v_rates, interlaced=(False, True), timing=4, monitor=None):
+    """RateIndex over every combination of the given values, timings
+       computed with a timing standard.
+
+       With a monitor (profile or profile name), only the modes the display
+       accepts are indexed; the ones no timing could fit are skipped before
+       being computed.
+    """
+    monitor = monitors.get_profile(monitor)
+    modes = []
+    pruned = 0
+    for h_active, v_active, v_rate, scan in itertools.product(h_actives, v_actives, v_rates, interlaced):
+        if monitor is not None and not monitors.may_admit(monitor, h_active, v_active, v_rate, scan):
+            pruned += 1
+            continue
+        mode = compute_indexed_mode(h_active, v_active, v_rate, scan, timing)
+        if mode is None:
+            continue
+        if monitor is not None and not monitors.admits(monitor, mode.actual_h_rate, mode.actual_v_rate, mode.p_clock):
+            continue
+        modes.append(mode)
+    logger.info("Indexed %s modes, %s pruned", len(modes), pruned)
+    return RateIndex(modes)
+
+
+__all__ = ['IndexedMode', 'RateIndex', 'build_rate_index']
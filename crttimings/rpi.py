@@ -0,0 +1,117 @@
+"""rpi: pixel clocks Raspberry Pi boards can actually produce.
+
+   The pixel clock comes out of a PLL multiplying a reference clock by
+   ndiv + frac / 2 ** frac_bits, divided by an integer pixel divider. The
+   divider is not free: it is the smallest one bringing the VCO frequency
+   within its range (clock * divider >= vco_min), as the firmware sets the
+   PLL up, so the VCO steps of reference / 2 ** frac_bits get coarser on
+   the pixel clock as it grows. A clock is achievable when that divider
+   exists (not over max_divider, VCO not over vco_max) and a multiplier
+   lands within a quarter of a p_clock unit (10 kHz) of it.
+
+   The achievable clocks of a board are computed once, on first use, into a
+   sorted array: snapping a clock or listing the clocks of a window are
+   binary searches.
+"""
+import array
+import bisect
+import collections
+import logging
+
+from .constants import Constants
+
+logger = logging.getLogger(__name__)
+
+
+BoardPLL = collections.namedtuple('BoardPLL', [
+    'name', 'reference', 'vco_min', 'vco_max', 'frac_bits', 'max_divider', 'min_clock', 'max_clock',
+])
+
+BOARDS = dict((board[0], BoardPLL(*board)) for board in Constants.RPI_BOARD_PLLS)
+
+# largest distance (Hz) between a PLL output and the p_clock value it stands for
+TOLERANCE = 2500
+
+
+def is_achievable(board, p_clock):
+    """True when a PLL setting and divider of board produce p_clock (10 kHz)"""
+    scale = 1 << board.frac_bits
+    frequency = p_clock * 10000
+    divider = pll_divider(board, p_clock)
+    if divider is None:
+        return False
+    # PLL multiplier, in 1/scale units, nearest to the wanted frequency
+    ticks = (frequency * divider * scale * 2 + board.reference) // (board.reference * 2)
+    return abs(board.reference * ticks - frequency * divider * scale) <= TOLERANCE * divider * scale
+
+
+def pll_divider(board, p_clock):
+    """Pixel divider of board for p_clock (10 kHz): the smallest one
+       keeping the VCO over vco_min, None when there is none"""
+    frequency = p_clock * 10000
+    divider = max(-(-board.vco_min // frequency), 1)
+    if divider > board.max_divider or frequency * divider > board.vco_max:
+        return None
+    return divider
+
+
+def achievable_clocks(board):
+    """Sorted array of the p_clock values (10 kHz) a board can produce"""
+    return array.array('q', (
+        p_clock for p_clock in range(board.min_clock, board.max_clock + 1)
+        if is_achievable(board, p_clock)))
+
+
+class ClockTable(object):
+    """Achievable clocks of a board"""
+    _tables = {}
+
+    def __init__(self, board):
+        self.board = board
+        self.clocks = achievable_clocks(board)
+        logger.debug("%s: %s achievable clocks", board.name, len(self.clocks))
+
+    @classmethod
+    def for_board(cls, board):
+        """Shared ClockTable for a board or a board name"""
+        if not isinstance(board, BoardPLL):
+            board = BOARDS[board]
+        table = cls._tables.get(board)
+        if table is None:
+            table = cls._tables[board] = cls(board)
+        return table
+
+    def __len__(self):
+        return len(self.clocks)
+
+    def __contains__(self, p_clock):
+        i = bisect.bisect_left(self.clocks, p_clock)
+        return i < len(self.clocks) and self.clocks[i] == p_clock
+
+    def covers(self, p_clock):
+        """True when p_clock is within the range of the board clocks"""
+        return bool(self.clocks) and self.clocks[0] <= p_clock <= self.clocks[-1]
+
+    def snap(self, p_clock):
+        """Achievable clock nearest to p_clock (the lower one on a tie)"""
+        i = bisect.bisect_left(self.clocks, p_clock)
+        if i == 0:
+            return self.clocks[0]
+        if i == len(self.clocks):
+            return self.clocks[-1]
+        below, above = self.clocks[i - 1], self.clocks[i]
+        return below if p_clock - below <= above - p_clock else above
+
+    def within(self, low, high):
+        """Achievable clocks in [low, high]"""
+        return self.clocks[bisect.bisect_left(self.clocks, low):bisect.bisect_right(self.clocks, high)]
+
+
+def clock_table(board):
+    """ClockTable for a board name, a BoardPLL, a ClockTable or None"""
+    if board is None or isinstance(board, ClockTable):
+        return board
+    return ClockTable.for_board(board)
+
+
+__all__ = ['BoardPLL', 'BOARDS', 'ClockTable', 'is_achievable', 'pll_divider', 'achievable_clocks', 'clock_table']
@@ -0,0 +1,152 @@
+"""sharedcolumns: sweep results written by the workers into shared memory.
+
+   The parent allocates one multiprocessing.shared_memory block holding an
+   int64 column per field of FIELDS, plus timing and ok, with one row per
+   task: grid point index * number of timing standards + standard - 1.
+   Workers attach to the block for each chunk, store their results at their
+   rows and detach; only chunk numbers travel back through the pool,
+   nothing is pickled per result. The parent reads the columns as
+   memoryviews over the block, without copying.
+
+   Rows left empty (failed standard, mode out of the monitor profile, point
+   that raised) have timing 0; the points that raised are listed in the
+   failed attribute of the returned columns.
+"""
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+
+from .crttimings import FIELDS, TIMING_STANDARDS, _get_fields
+from . import monitors, sweep
+
+logger = logging.getLogger(__name__)
+
+
+SHARED_FIELDS = FIELDS + ('timing', 'ok')
+
+
+def _attach_block(name):
+    """Existing shared memory block, left out of the resource tracker (its
+       creator unlinks it) where Python allows it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13, attaching always registers the block
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedColumns(object):
+    """int64 columns of rows results in a shared memory block, created
+       when name is None, attached to otherwise"""
+    def __init__(self, rows, name=None, fields=SHARED_FIELDS):
+        self.rows = rows
+        self.fields = tuple(fields)
+        # grid points that could not be computed, see sweep_shared
+        self.failed = []
+        size = max(rows * len(self.fields) * 8, 1)
+        if name is None:
+            # new blocks are zero filled by the system
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = _attach_block(name)
+        self.name = self.memory.name
+        view = self.memory.buf[:rows * len(self.fields) * 8].cast('q')
+        self.columns = dict(
+            (field, view[i * rows:(i + 1) * rows]) for i, field in enumerate(self.fields))
+        self._views = [view]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
+
+    def column(self, field):
+        return self.columns[field]
+
+    def write(self, row, timing, *extra):
+        """Stores a DetailedResolution or TimingSnapshot, then the values of
+           the fields following FIELDS, at row"""
+        for field, value in zip(self.fields, _get_fields(timing) + extra):
+            self.columns[field][row] = int(value)
+
+    def read(self, row):
+        """Values of every field at row"""
+        return tuple(self.columns[field][row] for field in self.fields)
+
+    def close(self):
+        """Releases the views and detaches from the block"""
+        if self.memory is None or not self._views:
+            return
+        for view in self.columns.values():
+            view.release()
+        for view in self._views:
+            view.release()
+        self.columns = {}
+        self._views = []
+        self.memory.close()
+
+    def unlink(self):
+        """Frees the block, done once by its creator"""
+        if self.memory is not None:
+            self.memory.unlink()
+            self.memory = None
+
+
+def task_row(point, timing):
+    # standards registered so far, Manual aside
+    return point * (len(TIMING_STANDARDS) - 1) + timing - 1
+
+
+def compute_chunk_shared(task):
+    """Computes a (grid, chunk size, chunk, monitor, block name, rows) task
+       into the block columns, returns (chunk, rows written, failed point
+       indexes)"""
+    grid, chunk_size, chunk, monitor, name, rows = task
+    columns = SharedColumns(rows, name)
+    written = 0
+    failed = []
+    try:
+        for point, results in sweep.iter_chunk_points(grid, chunk_size, chunk, monitor):
+            if results is None:
+                failed.append(point)
+                continue
+            for result in results:
+                columns.write(task_row(point, result.timing), result.values, result.timing, result.ok)
+                written += 1
+    finally:
+        columns.close()
+    return chunk, written, failed
+
+
+def sweep_shared(grid, chunk_size=256, processes=None, monitor=None, on_chunk=None):
+    """Sweeps grid into a new SharedColumns, returned to the caller who
+       closes and unlinks it (or uses it as a context manager).
+
+       on_chunk(chunk, rows written) is called as chunks finish.
+    """
+    monitor = monitors.get_profile(monitor)
+    rows = sweep.grid_size(grid) * (len(TIMING_STANDARDS) - 1)
+    columns = SharedColumns(rows)
+    tasks = [(grid, chunk_size, chunk, monitor, columns.name, rows)
+             for chunk in range(sweep.chunk_count(grid, chunk_size))]
+    logger.info("Sweeping %s chunks of %s points into %s", len(tasks), chunk_size, columns.name)
+    pool = multiprocessing.Pool(processes)
+    try:
+        for chunk, written, failed in pool.imap_unordered(compute_chunk_shared, tasks):
+            columns.failed.extend(failed)
+            if on_chunk is not None:
+                on_chunk(chunk, written)
+        pool.close()
+    except BaseException:
+        columns.close()
+        columns.unlink()
+        raise
+    finally:
+        pool.terminate()
+        pool.join()
+    return columns
+
+
+__all__ = ['SHARED_FIELDS', 'SharedColumns', 'task_row', 'sweep_shared']
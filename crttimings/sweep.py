@@ -0,0 +1,226 @@
+"""sweep: compute every timing standard over a grid of modes.
+
+   The grid is h_active x v_active x v_rate x scan type; every point is
+   computed with all the automatic timing standards in one shared pass
+   (DetailedResolution.calculate_all_timings). Points are numbered in
+   itertools.product order and split into chunks of consecutive points,
+   spread over a process pool; results are handed over chunk by chunk, as
+   they finish (in no particular order).
+
+   sweep() writes the results to a columnar dump (see columns: every FIELDS
+   column, plus timing and ok) and records its progress in a JSON
+   checkpoint next to it, replaced atomically after each chunk. Running it
+   again on the same directory resumes: chunks already done are skipped and
+   rows written after the last checkpoint are dropped.
+
+   A point that raises while it is computed is logged and recorded in the
+   failed list of the checkpoint, the sweep goes on.
+
+   Usage:
+     sweep <outdir> --h-active=<values> --v-active=<values> --v-rate=<values>
+           [--interlaced=<values>] [--chunk-size=<n>] [--processes=<n>]
+           [--monitor=<name>]
+
+   Options:
+     --h-active=<values>    Comma separated values or start:stop:step ranges
+     --v-active=<values>    Same, in lines (per field when interlaced)
+     --v-rate=<values>      Same, in 1/1000 Hz
+     --interlaced=<values>  Scan types, 0 and/or 1 [default: 0,1]
+     --chunk-size=<n>       Grid points per chunk [default: 256]
+     --processes=<n>        Number of worker processes [default: all cores]
+     --monitor=<name>       Only keep modes within a monitor profile
+"""
+import collections
+import json
+import logging
+import multiprocessing
+import os
+
+from .constants import Constants
+from . import crttimings, columns, monitors
+
+logger = logging.getLogger(__name__)
+
+
+Grid = collections.namedtuple('Grid', ['h_actives', 'v_actives', 'v_rates', 'interlaced'])
+
+CHECKPOINT_NAME = 'checkpoint.json'
+EXTRA_FIELDS = ('timing', 'ok')
+
+
+def make_grid(h_actives, v_actives, v_rates, interlaced=(False, True)):
+    return Grid(tuple(int(h) for h in h_actives), tuple(int(v) for v in v_actives),
+                tuple(int(r) for r in v_rates), tuple(bool(i) for i in interlaced))
+
+
+def grid_size(grid):
+    return len(grid.h_actives) * len(grid.v_actives) * len(grid.v_rates) * len(grid.interlaced)
+
+
+def grid_point(grid, index):
+    """(h_active, v_active, v_rate, interlaced) of the point at index, in
+       itertools.product order"""
+    index, i = divmod(index, len(grid.interlaced))
+    index, r = divmod(index, len(grid.v_rates))
+    h, v = divmod(index, len(grid.v_actives))
+    return grid.h_actives[h], grid.v_actives[v], grid.v_rates[r], grid.interlaced[i]
+
+
+def chunk_count(grid, chunk_size):
+    return -(-grid_size(grid) // chunk_size)
+
+
+def compute_point(h_active, v_active, v_rate, interlaced, monitor=None):
+    """StandardTiming list of a grid point, without the standards that
+       failed or fall out of monitor"""
+    if monitor is not None and not monitors.may_admit(monitor, h_active, v_active, v_rate, interlaced):
+        return []
+    detres = crttimings.detailed_resolution_for(h_active, v_active, v_rate, interlaced, 1)
+    results = []
+    for result in detres.calculate_all_timings():
+        values = result.values
+        if Constants.BLANK in (values.actual_h_rate, values.actual_v_rate, values.p_clock):
+            continue
+        if monitor is not None and not monitors.admits(monitor, values.actual_h_rate, values.actual_v_rate, values.p_clock):
+            continue
+        results.append(result)
+    return results
+
+
+def iter_chunk_points(grid, chunk_size, chunk, monitor=None):
+    """Yields (point index, StandardTiming list) for the points of a chunk,
+       the list being None when the point could not be computed"""
+    for index in range(chunk * chunk_size, min((chunk + 1) * chunk_size, grid_size(grid))):
+        point = grid_point(grid, index)
+        try:
+            results = compute_point(*point, monitor=monitor)
+        except Exception:
+            logger.exception("Could not compute point %s %s", index, point)
+            results = None
+        yield index, results
+
+
+def compute_chunk(task):
+    """(chunk, StandardTiming list, failed point indexes) for a (grid,
+       chunk size, chunk, monitor) task"""
+    results = []
+    failed = []
+    for index, point_results in iter_chunk_points(*task):
+        if point_results is None:
+            failed.append(index)
+        else:
+            results.extend(point_results)
+    return task[2], results, failed
+
+
+def iter_sweep(grid, chunk_size=256, processes=None, skip=(), monitor=None):
+    """Yields (chunk, StandardTiming list, failed point indexes) as chunks
+       finish, chunks in skip are not computed"""
+    monitor = monitors.get_profile(monitor)
+    skip = frozenset(skip)
+    tasks = [(grid, chunk_size, chunk, monitor)
+             for chunk in range(chunk_count(grid, chunk_size)) if chunk not in skip]
+    logger.info("Sweeping %s chunks of %s points", len(tasks), chunk_size)
+    if not tasks:
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(compute_chunk, tasks):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def write_checkpoint(path, checkpoint):
+    """Writes checkpoint (a dict) to path atomically"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path):
+    """Checkpoint dict at path, None when there is none"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def sweep(grid, outdir, chunk_size=256, processes=None, monitor=None, on_chunk=None):
+    """Sweeps grid into a columnar dump in outdir, resuming a previous run
+       of the same sweep, returns the number of rows of the dump.
+
+       on_chunk(chunk, results) is called for every chunk written. Points
+       that could not be computed are listed in the failed entry of the
+       checkpoint.
+    """
+    monitor = monitors.get_profile(monitor)
+    checkpoint_path = os.path.join(outdir, CHECKPOINT_NAME)
+    settings = dict(grid=grid._asdict(), chunk_size=chunk_size,
+                    monitor=monitor.name if monitor is not None else None)
+    checkpoint = read_checkpoint(checkpoint_path)
+    if checkpoint is not None:
+        stored = dict((key, checkpoint[key]) for key in settings)
+        if stored != json.loads(json.dumps(settings)):
+            raise ValueError("{} holds another sweep".format(outdir))
+        logger.info("Resuming after %s chunks, %s rows", len(checkpoint['done']), checkpoint['rows'])
+        writer = columns.ColumnWriter(outdir, extra_fields=EXTRA_FIELDS, rows=checkpoint['rows'])
+    else:
+        checkpoint = dict(settings, done=[], failed=[], rows=0)
+        writer = columns.ColumnWriter(outdir, extra_fields=EXTRA_FIELDS)
+        write_checkpoint(checkpoint_path, checkpoint)
+
+    with writer:
+        for chunk, results, failed in iter_sweep(grid, chunk_size, processes, checkpoint['done'], monitor):
+            for result in results:
+                writer.append(result.values, result.timing, result.ok)
+            writer.flush()
+            checkpoint['done'].append(chunk)
+            checkpoint.setdefault('failed', []).extend(failed)
+            checkpoint['rows'] = writer.rows
+            write_checkpoint(checkpoint_path, checkpoint)
+            if on_chunk is not None:
+                on_chunk(chunk, results)
+    if checkpoint.get('failed'):
+        logger.warning("%s points could not be computed", len(checkpoint['failed']))
+    return writer.rows
+
+
+def parse_values(text):
+    """Integers of a comma separated list of values and start:stop:step
+       ranges (stop included)"""
+    values = []
+    for part in text.split(','):
+        part = part.strip()
+        if ':' in part:
+            start, stop, step = (part.split(':') + ['1'])[:3]
+            values.extend(range(int(start), int(stop) + 1, int(step)))
+        elif part:
+            values.append(int(part))
+    return values
+
+
+def main(argv=None):
+    import docopt
+
+    args = docopt.docopt(__doc__, argv)
+    processes = args['--processes']
+    processes = None if processes == 'all cores' else int(processes)
+    grid = make_grid(parse_values(args['--h-active']), parse_values(args['--v-active']),
+                     parse_values(args['--v-rate']), parse_values(args['--interlaced']))
+    rows = sweep(grid, args['<outdir>'], int(args['--chunk-size']), processes, args['--monitor'])
+    print(rows)
+    return 0
+
+
+__all__ = ['Grid', 'make_grid', 'grid_point', 'compute_point', 'iter_sweep', 'sweep']
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
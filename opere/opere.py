@@ -29,45 +29,533 @@ compose together operations researches.
 
 For the moment, the program works OK with one goal but this hardly
 qualifies as operational research. 
+
+Strategies decide how the steps are applied. Greedy (the default) cycles
+through the steps until the goals are reached. SimulatedAnnealing,
+RandomRestart and TabuSearch also use moves: an optional collection of
+callables changing the object in both directions, used to leave states
+where the steps get stuck. They save and restore the object state
+(through its own save_state/restore_state methods when it has them, its
+__dict__ otherwise, see Opere.save_state) and use a seeded random
+generator so a search can be replayed.
+
+The strategy is picked per call, either as a Strategy instance or by name
+(see STRATEGIES). After a call, effort tells how much work it took.
+
+Objects exposing a version attribute (changed whenever their state
+changes) get their goals evaluated only when that version changed: after a
+step that did nothing, the cached goal states are reused and no value or
+derivative is recorded.
+
+The greedy strategy watches the states it goes through (hashes of
+state_key over the last cycle_window steps) and reacts when it comes back
+to one of them, as when two steps undo each other, according to
+cycle_policy (state_key is made of the state_fields values of the object;
+when none are declared it is the object version, which only tells
+unchanged states apart, or a new key after each step without a version):
+    'shrink': make the steps smaller (shrink_steps), or switch if they
+              cannot shrink
+    'switch': leave the step that closed the cycle out for a while
+    'stop': stop with the best state seen
+    None: no detection
+Unless cycle_policy is None, the greedy strategy also stops as soon as a
+whole round of steps leaves the state unchanged.
+
+Goals can also be stated as GoalSpec(field, target, tolerance, weight):
+the goal is reached while the field stays within target +/- tolerance *
+|target|, otherwise it is the weighted signed distance to that window.
+Specs are compiled once (compile_goal, or add_goals on an Opere) into
+plain goal callables; a GoalSet also compiles them into evaluators over
+columns of values (sequences or NumPy arrays) to rate many states at once.
+
+constraints: optional collection of callables that take the manipulated
+object as parameter and return True when it is within hard bounds. A step
+or move taking the object out of a bound it was within is undone (it still
+uses a step), whatever the strategy.
 """
 
-import itertools
 import collections
+import itertools
 import logging
+import math
+import operator
+import random
 
 logger = logging.getLogger(__name__)
 
+# state keys of objects without state_fields nor version, never seen twice
+_unknown_states = itertools.count(-1, -1)
+
+
+Effort = collections.namedtuple('Effort', ['strategy', 'steps', 'goal_evaluations', 'skipped_evaluations', 'cycles', 'reached'])
+
+
+GoalSpec = collections.namedtuple('GoalSpec', ['field', 'target', 'tolerance', 'weight'])
+GoalSpec.__new__.__defaults__ = (0, 1)
+
+
+def goal_window(spec):
+    """(low, high) values reaching a GoalSpec"""
+    margin = spec.tolerance * abs(spec.target)
+    return spec.target - margin, spec.target + margin
+
+
+def compile_goal(spec):
+    """Goal callable for a GoalSpec"""
+    get = operator.attrgetter(spec.field)
+    low, high = goal_window(spec)
+    weight = spec.weight
+
+    def goal(obj):
+        value = get(obj)
+        if value < low:
+            return (value - low) * weight
+        if value > high:
+            return (value - high) * weight
+        return 0
+    goal.__name__ = 'goal_' + spec.field
+    goal.spec = spec
+    return goal
+
+
+def compile_vector_goal(spec):
+    """Callable returning the goal values of a GoalSpec for every row of a
+       mapping field -> column (a NumPy array gives a NumPy array)"""
+    low, high = goal_window(spec)
+    weight = spec.weight
+
+    def goal(columns):
+        values = columns[spec.field]
+        if hasattr(values, 'clip'):
+            return (values - values.clip(low, high)) * weight
+        return [((value - low) if value < low else (value - high) if value > high else 0) * weight
+                for value in values]
+    goal.__name__ = 'vector_goal_' + spec.field
+    goal.spec = spec
+    return goal
+
+
+def compile_vector_mask(spec):
+    """Callable telling for every row of a mapping field -> column whether
+       it reaches a GoalSpec (a NumPy array gives a boolean NumPy array)"""
+    low, high = goal_window(spec)
+
+    def reached(columns):
+        values = columns[spec.field]
+        if hasattr(values, 'clip'):
+            return (values >= low) & (values <= high)
+        return [low <= value <= high for value in values]
+    reached.__name__ = 'vector_mask_' + spec.field
+    reached.spec = spec
+    return reached
+
+
+class GoalSet(object):
+    """GoalSpecs compiled once into scalar goals and column evaluators"""
+    def __init__(self, specs):
+        self.specs = tuple(specs)
+        self.goals = [compile_goal(spec) for spec in self.specs]
+        self.vector_goals = [compile_vector_goal(spec) for spec in self.specs]
+        # goals of weight 0 are always reached
+        self.vector_masks = [compile_vector_mask(spec) for spec in self.specs if spec.weight]
+
+    def cost(self, obj):
+        return sum(abs(goal(obj)) for goal in self.goals)
+
+    def reached(self, obj):
+        return all(goal(obj) == 0 for goal in self.goals)
+
+    def column_costs(self, columns):
+        """Cost of every row of a mapping field -> column"""
+        total = None
+        for goal in self.vector_goals:
+            values = goal(columns)
+            if hasattr(values, 'clip'):
+                values = abs(values)
+                total = values if total is None else total + values
+            elif total is None:
+                total = [abs(value) for value in values]
+            else:
+                total = [a + abs(b) for a, b in zip(total, values)]
+        return total
+
+    def reached_rows(self, columns):
+        """Indexes of the rows reaching every goal (a NumPy array of them
+           for NumPy columns)"""
+        mask = None
+        for reached in self.vector_masks:
+            rows = reached(columns)
+            if hasattr(rows, 'nonzero'):
+                mask = rows if mask is None else mask & rows
+            elif mask is None:
+                mask = rows
+            else:
+                mask = [a and b for a, b in zip(mask, rows)]
+        if mask is None:
+            # nothing to reach
+            return list(range(len(columns[self.specs[0].field]))) if self.specs else []
+        if hasattr(mask, 'nonzero'):
+            return mask.nonzero()[0]
+        return [i for i, row in enumerate(mask) if row]
+
+
+class CycleDetector(object):
+    """Remembers the hashes of the last window states"""
+    def __init__(self, window=32):
+        self.window = window
+        self.recent = collections.deque()
+        self.counts = collections.Counter()
+        self.last = None
+        self.unchanged = False
+
+    def push(self, key):
+        """Records a state, returns True when it was seen in the window
+           (staying in the same state is not a cycle)"""
+        h = hash(key)
+        self.unchanged = h == self.last
+        if self.unchanged:
+            return False
+        self.last = h
+        cycle = h in self.counts
+        self.recent.append(h)
+        self.counts[h] += 1
+        if len(self.recent) > self.window:
+            old = self.recent.popleft()
+            self.counts[old] -= 1
+            if not self.counts[old]:
+                del self.counts[old]
+        return cycle
+
+    def clear(self):
+        self.recent.clear()
+        self.counts.clear()
+        self.last = None
+
+
 class Opere(object):
-    def __init__(self, max_steps=1000):
+    # fields of the manipulated object making its state_key
+    state_fields = ()
+
+    def __init__(self, max_steps=1000, strategy=None, seed=None, cycle_policy='shrink', cycle_window=32):
         self.max_steps = max_steps
+        self.cycle_policy = cycle_policy
+        self.cycle_window = cycle_window
+        self.cycles = 0
         self.steps_left = self.max_steps
+        self.strategy = strategy
+        self.seed = seed
         self.goals = []
         self.steps = []
+        self.moves = []
+        self.constraints = []
         self.goals_states = {}
         self.goals_values = {}
         self.goals_derivatives = {}
+        self.goal_evaluations = 0
+        self.skipped_evaluations = 0
+        self.evaluated_version = None
+        self.effort = None
 
-    def call(self, obj):
-        """Loops over steps until we have reached all goals
+    def call(self, obj, strategy=None):
+        """Searches with a strategy until we have reached all goals
            or we have exhausted our step count"""
-        steps_cycle = itertools.cycle(self.steps)
+        strategy = get_strategy(strategy or self.strategy, self.seed)
+        self.steps_left = self.max_steps
+        self.goal_evaluations = 0
+        self.skipped_evaluations = 0
+        self.cycles = 0
+        self.evaluated_version = getattr(obj, 'version', None)
         for goal in self.goals:
             self.goals_states[goal] = goal(obj)
             self.goals_values[goal] = collections.deque(maxlen=100)
             self.goals_derivatives[goal] = collections.deque(maxlen=100)
             self.goals_values[goal].append(self.goals_states[goal])
+        self.goal_evaluations += len(self.goals)
+
+        reached = strategy.run(self, obj)
+        self.effort = Effort(strategy.name, self.max_steps - self.steps_left,
+                             self.goal_evaluations, self.skipped_evaluations, self.cycles, reached)
+        logger.debug("%s", self.effort)
+        return reached
+
+    def add_goals(self, specs):
+        """Compiles GoalSpecs into goals appended to self.goals, returns
+           them"""
+        goals = [compile_goal(spec) for spec in specs]
+        self.goals.extend(goals)
+        return goals
 
-        while self.steps_left > 0:
-            for goal in self.goals:
-                old_value = self.goals_states[goal]
-                new_value = goal(obj)
-                self.goals_states[goal] = new_value
-                self.goals_values[goal].append(new_value)
-                self.goals_derivatives[goal].append(new_value - old_value)
-            if all(a == 0 for a in self.goals_states.values()):
-                logger.debug("Goals all reached in %s steps", self.max_steps - self.steps_left)
+    def evaluate(self, obj):
+        """Runs every goal on obj, updating states, values and derivatives,
+           unless obj did not change since the last evaluation"""
+        version = getattr(obj, 'version', None)
+        if version is not None and version == self.evaluated_version:
+            self.skipped_evaluations += len(self.goals)
+            return
+        self.evaluated_version = version
+        for goal in self.goals:
+            old_value = self.goals_states[goal]
+            new_value = goal(obj)
+            self.goals_states[goal] = new_value
+            self.goals_values[goal].append(new_value)
+            self.goals_derivatives[goal].append(new_value - old_value)
+        self.goal_evaluations += len(self.goals)
+
+    def reached(self):
+        return all(a == 0 for a in self.goals_states.values())
+
+    def cost(self):
+        """Distance to the goals, 0 when all of them are reached"""
+        return sum(abs(a) for a in self.goals_states.values())
+
+    def save_state(self, obj):
+        save = getattr(obj, 'save_state', None)
+        obj_state = dict(obj.__dict__) if save is None else save()
+        return (obj_state, dict(self.goals_states), self.evaluated_version)
+
+    def restore_state(self, obj, state):
+        obj_state, goals_states, self.evaluated_version = state
+        restore = getattr(obj, 'restore_state', None)
+        if restore is None:
+            obj.__dict__.clear()
+            obj.__dict__.update(obj_state)
+        else:
+            restore(obj_state)
+        self.goals_states.update(goals_states)
+
+    def state_key(self, obj):
+        """Hashable identity of the object state: its state_fields values,
+           or its version when there are none"""
+        if not self.state_fields:
+            version = getattr(obj, 'version', None)
+            return next(_unknown_states) if version is None else version
+        return tuple(getattr(obj, field) for field in self.state_fields)
+
+    def apply(self, obj, step):
+        """Applies a step or move to obj, undoing it when it breaks a
+           constraint obj was within, returns False when undone"""
+        if not self.constraints:
+            step(obj)
+            return True
+        before = [constraint(obj) for constraint in self.constraints]
+        state = self.save_state(obj)
+        step(obj)
+        for constraint, within in zip(self.constraints, before):
+            if within and not constraint(obj):
+                self.restore_state(obj, state)
+                return False
+        return True
+
+    def shrink_steps(self):
+        """Makes the steps smaller to leave a cycle, returns False when
+           they cannot be"""
+        return False
+
+    def neighbours(self):
+        return self.moves or self.steps
+
+    def perturb(self, obj, rng):
+        self.apply(obj, rng.choice(self.neighbours()))
+
+
+class Strategy(object):
+    """How an Opere applies its steps: run(opere, obj) returns True when
+       all goals are reached, each change applied to obj uses one step"""
+    name = None
+
+    def __init__(self, seed=None):
+        self.seed = seed
+
+    def run(self, opere, obj):
+        raise NotImplementedError
+
+
+class Greedy(Strategy):
+    """Cycles deterministically through the steps"""
+    name = 'greedy'
+
+    def run(self, opere, obj, limit=None):
+        steps_cycle = itertools.cycle(opere.steps)
+        stop = -1 if limit is None else max(opere.steps_left - limit, 0)
+        policy = opere.cycle_policy
+        if policy is not None:
+            detector = CycleDetector(opere.cycle_window)
+            detector.push(opere.state_key(obj))
+            best, best_state = None, None
+            # step -> steps_left value under which it can be used again
+            banned = {}
+            unchanged = 0
+        while opere.steps_left > 0 and opere.steps_left != stop:
+            opere.evaluate(obj)
+            if opere.reached():
+                logger.debug("Goals all reached in %s steps", opere.max_steps - opere.steps_left)
                 return True
             step = next(steps_cycle)
-            step(obj)
-            self.steps_left -= 1
+            if policy is not None:
+                cost = opere.cost()
+                if best is None or cost < best:
+                    best, best_state = cost, opere.save_state(obj)
+                skipped = 0
+                while opere.steps_left > banned.get(step, opere.steps_left):
+                    step = next(steps_cycle)
+                    skipped += 1
+                    if skipped == len(opere.steps):
+                        logger.debug("Every step is left out, stopping")
+                        opere.restore_state(obj, best_state)
+                        return opere.reached()
+            opere.apply(obj, step)
+            opere.steps_left -= 1
+            if policy is None:
+                continue
+            if detector.push(opere.state_key(obj)):
+                unchanged = 0
+                opere.cycles += 1
+                logger.debug("Cycle detected after %s steps", opere.max_steps - opere.steps_left)
+                if policy == 'shrink' and opere.shrink_steps():
+                    detector.clear()
+                elif policy in ('shrink', 'switch'):
+                    banned[step] = opere.steps_left - opere.cycle_window
+                    detector.clear()
+                else:
+                    opere.restore_state(obj, best_state)
+                    return opere.reached()
+            elif detector.unchanged:
+                unchanged += 1
+                if unchanged >= len(opere.steps):
+                    # a whole round of steps did nothing, nothing else will
+                    logger.debug("Steps stuck after %s steps", opere.max_steps - opere.steps_left)
+                    opere.evaluate(obj)
+                    return opere.reached()
+            else:
+                unchanged = 0
+        opere.evaluate(obj)
+        return opere.reached()
+
+
+class SimulatedAnnealing(Strategy):
+    """Applies random moves, accepting the ones moving away from the goals
+       with a probability decreasing with the temperature.
+
+       temperature defaults to the initial cost, it is multiplied by
+       cooling after each move.
+    """
+    name = 'annealing'
+
+    def __init__(self, seed=None, temperature=None, cooling=0.95, min_temperature=1e-3):
+        super(SimulatedAnnealing, self).__init__(seed)
+        self.temperature = temperature
+        self.cooling = cooling
+        self.min_temperature = min_temperature
+
+    def run(self, opere, obj):
+        rng = random.Random(self.seed)
+        current = opere.cost()
+        best, best_state = current, opere.save_state(obj)
+        temperature = self.temperature or max(current, 1.0)
+        while opere.steps_left > 0 and current > 0:
+            state = opere.save_state(obj)
+            opere.perturb(obj, rng)
+            opere.steps_left -= 1
+            opere.evaluate(obj)
+            cost = opere.cost()
+            if cost <= current or rng.random() < math.exp((current - cost) / temperature):
+                current = cost
+                if cost < best:
+                    best, best_state = cost, opere.save_state(obj)
+            else:
+                opere.restore_state(obj, state)
+            temperature = max(temperature * self.cooling, self.min_temperature)
+        opere.restore_state(obj, best_state)
+        return opere.reached()
+
+
+class RandomRestart(Strategy):
+    """Runs the greedy strategy, restarting from a random walk away from
+       the initial state when it does not reach the goals.
+
+       The step budget is split evenly between the restarts.
+    """
+    name = 'restart'
+
+    def __init__(self, seed=None, restarts=10, walk=8):
+        super(RandomRestart, self).__init__(seed)
+        self.restarts = restarts
+        self.walk = walk
+
+    def run(self, opere, obj):
+        rng = random.Random(self.seed)
+        greedy = Greedy()
+        initial = opere.save_state(obj)
+        best, best_state = opere.cost(), initial
+        budget = max(opere.steps_left // (self.restarts + 1), 1)
+        for attempt in range(self.restarts + 1):
+            if attempt:
+                opere.restore_state(obj, initial)
+                for _ in range(min(self.walk, opere.steps_left)):
+                    opere.perturb(obj, rng)
+                    opere.steps_left -= 1
+            if greedy.run(opere, obj, budget):
+                return True
+            if opere.cost() < best:
+                best, best_state = opere.cost(), opere.save_state(obj)
+            if opere.steps_left <= 0:
+                break
+        opere.restore_state(obj, best_state)
         return False
+
+
+class TabuSearch(Strategy):
+    """Moves to the best neighbouring state (see Opere.neighbours) that was
+       not visited during the last tenure moves"""
+    name = 'tabu'
+
+    def __init__(self, seed=None, tenure=50):
+        super(TabuSearch, self).__init__(seed)
+        self.tenure = tenure
+
+    def run(self, opere, obj):
+        rng = random.Random(self.seed)
+        tabu = collections.deque(maxlen=self.tenure)
+        tabu.append(opere.state_key(obj))
+        best, best_state = opere.cost(), opere.save_state(obj)
+        while opere.steps_left > 0 and not opere.reached():
+            state = opere.save_state(obj)
+            moves = list(opere.neighbours())
+            rng.shuffle(moves)
+            chosen = chosen_cost = chosen_key = None
+            for move in moves:
+                opere.apply(obj, move)
+                key = opere.state_key(obj)
+                if key not in tabu:
+                    opere.evaluate(obj)
+                    cost = opere.cost()
+                    if chosen is None or cost < chosen_cost:
+                        chosen, chosen_cost, chosen_key = opere.save_state(obj), cost, key
+                opere.restore_state(obj, state)
+            opere.steps_left -= 1
+            if chosen is None:
+                break
+            opere.restore_state(obj, chosen)
+            tabu.append(chosen_key)
+            if chosen_cost < best:
+                best, best_state = chosen_cost, chosen
+        if not opere.reached():
+            opere.restore_state(obj, best_state)
+        return opere.reached()
+
+
+STRATEGIES = {
+    Greedy.name: Greedy,
+    SimulatedAnnealing.name: SimulatedAnnealing,
+    RandomRestart.name: RandomRestart,
+    TabuSearch.name: TabuSearch,
+}
+
+
+def get_strategy(strategy, seed=None):
+    """Strategy instance for a Strategy, a strategy name or None (greedy)"""
+    if strategy is None:
+        return Greedy(seed)
+    if isinstance(strategy, Strategy):
+        return strategy
+    return STRATEGIES[strategy](seed)
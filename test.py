@@ -41,3 +41,672 @@ print(opera.goals_derivatives)
 
 
 #print(a)
+
+
+import io
+import itertools
+import json
+import os
+import pickle
+import random
+import shutil
+import tempfile
+
+from crttimings import columns, edid, formats, intervals, jsonl, keys, monitors, provision, rateindex, rpi, sharedcolumns, sweep
+from opere.opere import GoalSet, GoalSpec, Opere
+
+
+def test_hdmi_timings_crt_standard_1080p():
+    detres = crttimings.detailed_resolution_for(1920, 1080, 60000, False, 4)
+    line = formats.hdmi_timings_text(detres)
+    assert line == "hdmi_timings=1920 0 128 200 328 1080 1 3 5 365 0 0 0 60 0 224580000 3", line
+    values = line.split('=', 1)[1].split()
+    assert all(value.isdigit() for value in values), line
+    assert formats.parse_hdmi_timings(line).p_clock == 22458
+
+
+def test_edid_round_trip_float_fields():
+    modes = [crttimings.detailed_resolution_for(1920, 1080, 60000, False, 4),
+             crttimings.detailed_resolution_for(1280, 720, 60000, False, 4),
+             crttimings.detailed_resolution_for(720, 240, 60000, True, 4),
+             crttimings.detailed_resolution_for(640, 480, 60000, False, 1)]
+    assert isinstance(modes[0].p_clock, float)
+    block = edid.encode_edid_block(modes)
+    assert sum(bytearray(block)) % 256 == 0
+    records = list(edid.iter_edid_records(block))
+    assert len(records) == len(modes)
+    for record, detres in zip(records, modes):
+        expected = detres.as_record()
+        assert record[:9] == tuple(int(round(value)) for value in expected[:9]), (record, expected)
+        assert record[9:12] == (bool(expected.h_polarity), bool(expected.v_polarity), bool(expected.interlaced))
+
+
+def test_modeline_round_trip():
+    for args in ((1920, 1080, 60000, False, 4), (720, 240, 60000, True, 4), (320, 240, 60000, False, 2)):
+        detres = crttimings.detailed_resolution_for(*args)
+        line = formats.modeline_text(detres)
+        record = formats.parse_timing_line(line)
+        expected = detres.as_record()
+        assert record[:9] == tuple(int(round(value)) for value in expected[:9]), (line, record)
+        assert record.interlaced == bool(detres.interlaced)
+
+
+def test_parse_unquoted_modelines():
+    expected = formats.parse_modeline(
+        'Modeline "foo" 6.51 320 336 368 416 240 243 246 262 -hsync -vsync')
+    assert expected is not None and expected.p_clock == 651 and expected.h_active == 320
+    for line in ('Modeline foo 6.51 320 336 368 416 240 243 246 262 -hsync -vsync',
+                 'xrandr --newmode foo 6.51 320 336 368 416 240 243 246 262 -hsync -vsync',
+                 'xrandr --newmode "foo" 6.51 320 336 368 416 240 243 246 262 -hsync -vsync'):
+        assert formats.parse_timing_line(line) == expected, line
+
+
+def _mirror_fields(detres):
+    return (detres.v_active_i, detres.v_front_i, detres.v_sync_i, detres.v_back_i,
+            detres.v_blank_i, detres.v_total_i, detres.v_rate_i)
+
+
+def test_mirror_fields_do_not_depend_on_reads():
+    for args, edits in (((720, 480, 60000, False, 4), (('set_v_rate', 50000),)),
+                        ((640, 480, 60000, False, 4), (('set_v_rate', 50000), ('set_h_active', 720))),
+                        ((720, 240, 60000, True, 4), (('set_v_rate', 50000), ('set_timing', 5)))):
+        read = crttimings.detailed_resolution_for(*args)
+        unread = crttimings.detailed_resolution_for(*args)
+        _mirror_fields(read)
+        for method, value in edits:
+            getattr(read, method)(value)
+            _mirror_fields(read)
+            getattr(unread, method)(value)
+        assert _mirror_fields(read) == _mirror_fields(unread), (args, _mirror_fields(read), _mirror_fields(unread))
+
+
+def test_interlaced_toggle_keeps_definition():
+    detres = crttimings.detailed_resolution_for(720, 480, 60000, False, 4)
+    before = detres.snapshot()
+    detres.set_interlaced(True)
+    interlaced = detres.snapshot()
+    assert _mirror_fields(detres)[:6] == (before.v_active, before.v_front, before.v_sync, before.v_back,
+                                          before.v_blank, before.v_total)
+    detres.set_interlaced(False)
+    assert detres.snapshot().as_tuple()[:-7] == before.as_tuple()[:-7]
+    assert _mirror_fields(detres)[:6] == (interlaced.v_active, interlaced.v_front, interlaced.v_sync,
+                                          interlaced.v_back, interlaced.v_blank, interlaced.v_total)
+    copy = before.to_resolution()
+    assert copy.snapshot().as_tuple() == before.as_tuple()
+
+
+def test_sweep_chunk_records_failed_points():
+    grid = sweep.make_grid((320, 640), (240,), (60000,), (False,))
+    compute_point = sweep.compute_point
+
+    def failing(h_active, *args, **kwargs):
+        if h_active == 640:
+            raise ValueError("bad point")
+        return compute_point(h_active, *args, **kwargs)
+    sweep.compute_point = failing
+    # the failure is logged with its traceback
+    sweep.logger.disabled = True
+    try:
+        chunk, results, failed = sweep.compute_chunk((grid, 2, 0, None))
+    finally:
+        sweep.compute_point = compute_point
+        sweep.logger.disabled = False
+    assert chunk == 0 and failed == [1]
+    assert results and all(result.values.h_active == 320 for result in results)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_sweep_resume():
+    grid = sweep.make_grid(range(320, 400, 16), (240, 288), (50000, 60000), (False, True))
+    outdir = tempfile.mkdtemp()
+    try:
+        full = os.path.join(outdir, 'full')
+        rows = sweep.sweep(grid, full, chunk_size=4, processes=2)
+        resumed = os.path.join(outdir, 'resumed')
+
+        def interrupt(chunk, results):
+            raise Interrupted()
+        try:
+            sweep.sweep(grid, resumed, chunk_size=4, processes=2, on_chunk=interrupt)
+        except Interrupted:
+            pass
+        with open(os.path.join(resumed, sweep.CHECKPOINT_NAME)) as f:
+            checkpoint = json.load(f)
+        assert len(checkpoint['done']) == 1 and checkpoint['failed'] == []
+        assert sweep.sweep(grid, resumed, chunk_size=4, processes=2) == rows
+
+        def sorted_rows(directory):
+            loaded = columns.load_columns(directory, columns.FIELDS + sweep.EXTRA_FIELDS)
+            return sorted(zip(*[list(loaded[field]) for field in columns.FIELDS + sweep.EXTRA_FIELDS]))
+        assert sorted_rows(full) == sorted_rows(resumed)
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_sweep_shared_matches_sweep():
+    grid = sweep.make_grid(range(320, 400, 16), (240, 288), (50000, 60000), (False, True))
+    expected = {}
+    for index in range(sweep.grid_size(grid)):
+        for result in sweep.compute_point(*sweep.grid_point(grid, index)):
+            row = sharedcolumns.task_row(index, result.timing)
+            expected[row] = tuple(int(value) for value in result.values.as_tuple()) + (result.timing, result.ok)
+    with sharedcolumns.sweep_shared(grid, chunk_size=4, processes=2) as shared:
+        assert shared.failed == []
+        for row in range(shared.rows):
+            values = shared.read(row)
+            if row in expected:
+                assert values == expected[row], row
+            else:
+                assert values[-2] == 0, row
+
+
+def test_snapshot_value_type():
+    detres = crttimings.detailed_resolution_for(720, 240, 60000, True, 4)
+    snapshot = detres.snapshot()
+    values = tuple(getattr(detres, field) for field in crttimings.FIELDS)
+    assert snapshot == values and hash(snapshot) == hash(values)
+    assert tuple(snapshot) == values and snapshot[0] == 720 and len(snapshot) == len(crttimings.FIELDS)
+    assert crttimings.TimingSnapshot(**snapshot._asdict()) == snapshot
+    assert crttimings.TimingSnapshot._make(values) == snapshot
+    assert snapshot._replace(h_front=1).h_front == 1 and snapshot.h_front != 1
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+    assert len(set([snapshot, detres.snapshot(), snapshot._replace(native=True)])) == 2
+    try:
+        snapshot.h_front = 1
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("snapshots are immutable")
+    assert snapshot.to_resolution().snapshot() == snapshot
+    for result in detres.calculate_all_timings():
+        assert isinstance(result.values, crttimings.TimingSnapshot)
+
+
+def test_unique_timings():
+    modes = [crttimings.detailed_resolution_for(h, v, r, i)
+             for h in range(320, 480, 16) for v in (240, 480) for r in (50000, 60000) for i in (False, True)]
+    for detres in modes:
+        assert keys.key_record(keys.timing_key(detres)) == detres.as_record()._replace(native=False)
+    snapshots = [detres.snapshot() for detres in modes] * 3
+    random.Random(1).shuffle(snapshots)
+    unique = keys.UniqueTimings(max_pending=3)
+    distinct = set(keys.timing_key(snapshot) for snapshot in snapshots)
+    assert unique.update(snapshots) == len(distinct) == len(unique)
+    assert list(unique.keys()) == sorted(distinct)
+    assert all(detres in unique for detres in modes)
+    # runs halve in length at least: logarithmic in the number of keys
+    lengths = [len(run) for run in unique.runs]
+    assert all(a >= 2 * b for a, b in zip(lengths, lengths[1:])), lengths
+
+
+def test_goal_set_rows():
+    goals = GoalSet([GoalSpec('p_clock', 1000, 0.02), GoalSpec('h_active', 320, 0, 2),
+                     GoalSpec('v_active', 240, 0, 0)])
+    rows = {'p_clock': [1000, 1019, 1021, 980, 975, 1000],
+            'h_active': [320, 320, 320, 320, 320, 336],
+            'v_active': [240, 240, 240, 288, 240, 240]}
+    assert goals.reached_rows(rows) == [0, 1, 3]
+    assert goals.column_costs(rows) == [0, 0, 1.0, 0, 5.0, 32]
+    try:
+        import numpy
+    except ImportError:
+        return
+    arrays = dict((field, numpy.array(values)) for field, values in rows.items())
+    assert list(goals.reached_rows(arrays)) == [0, 1, 3]
+    assert list(goals.column_costs(arrays)) == [0, 0, 1.0, 0, 5.0, 32]
+
+
+def test_provision_output():
+    directory = tempfile.mkdtemp()
+    try:
+        inventory = os.path.join(directory, 'inventory.csv')
+        with open(inventory, 'w') as f:
+            f.write('device,display,h_active,v_active,v_rate,interlaced,timing,pixel_clock,monitor,board\n'
+                    'pi1,tv,1920,1080,60,0,4,,,\n'
+                    'pi2,tv,1920,1080,60,0,4,,,\n'
+                    'crt,pvm,320,240,60,0,4,6.4,,\n'
+                    'dim,pvm,320,240,60,0,0,6.4,15khz-tv,\n'
+                    'arcade,crt,720,240,60,1,4,,,\n'
+                    'wide,crt,1920,1080,60,0,4,,15khz-tv,\n')
+        outdir = os.path.join(directory, 'out')
+        failed = provision.provision(inventory, outdir, processes=2)
+        assert failed == ['dim', 'wide'], failed
+        fragments = {}
+        for device in ('pi1', 'pi2', 'crt', 'arcade'):
+            with open(provision.fragment_path(outdir, device)) as f:
+                fragments[device] = f.read()
+        assert fragments['pi1'] == fragments['pi2'] == formats.hdmi_config_fragment(
+            crttimings.detailed_resolution_for(1920, 1080, 60000, False, 4))
+        for device, fragment in fragments.items():
+            lines = fragment.splitlines()
+            assert lines[:2] == ['hdmi_group=2', 'hdmi_mode=87'], fragment
+            values = lines[2].split('=', 1)[1].split()
+            assert len(values) == 17 and all(value.isdigit() for value in values), fragment
+            assert formats.parse_hdmi_timings(lines[2]) is not None
+        crt = formats.parse_hdmi_timings(fragments['crt'].splitlines()[2])
+        assert crt.h_active == 320 and abs(crt.p_clock - 640) <= 640 * 0.02, crt
+        assert formats.parse_hdmi_timings(fragments['arcade'].splitlines()[2]).interlaced
+        for device in failed:
+            assert not os.path.exists(provision.fragment_path(outdir, device))
+    finally:
+        shutil.rmtree(directory)
+
+
+def _cea_extension(timings, natives):
+    block = bytearray(edid.EDID_BLOCK_SIZE)
+    block[0:4] = bytearray((edid.CEA_EXTENSION_TAG, 0x03, 4, 0x80 | natives))
+    edid.encode_dtds(timings, block, 4)
+    block[edid.CHECKSUM_OFFSET] = -sum(block) & 0xff
+    return block
+
+
+def test_edid_file_cea_extension():
+    base = [crttimings.detailed_resolution_for(1280, 720, 60000, False, 4),
+            crttimings.detailed_resolution_for(640, 480, 60000, False, 1)]
+    extension = [crttimings.detailed_resolution_for(1920, 1080, 60000, False, 4),
+                 crttimings.detailed_resolution_for(720, 240, 60000, True, 4),
+                 crttimings.detailed_resolution_for(320, 240, 60000, False, 2)]
+    dump = edid.encode_edid_block(base)
+    dump[edid.EXTENSION_COUNT_OFFSET] = 1
+    dump[edid.CHECKSUM_OFFSET] = (dump[edid.CHECKSUM_OFFSET] - 1) & 0xff
+    dump += _cea_extension(extension, 2)
+    # a second dump without extensions follows the first one
+    dump += edid.encode_edid_block(base[1:])
+    assert all(sum(dump[i:i + edid.EDID_BLOCK_SIZE]) % 256 == 0
+               for i in range(0, len(dump), edid.EDID_BLOCK_SIZE))
+    timings = base + extension + base[1:]
+    natives = [True, False, True, True, False, True]
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'edid.bin')
+        with open(path, 'wb') as f:
+            f.write(dump)
+        records = list(edid.iter_edid_file(path))
+        assert records == list(edid.iter_edid_records(dump))
+        assert [record.native for record in records] == natives
+        for record, detres in zip(records, timings):
+            expected = detres.as_record()
+            assert record[:9] == tuple(int(round(value)) for value in expected[:9]), (record, expected)
+            assert record.interlaced == bool(detres.interlaced)
+        resolutions = list(edid.iter_edid_file(path, records=False))
+        assert [(detres.h_active, detres.v_active) for detres in resolutions] == \
+            [(record.h_active, record.v_active) for record in records]
+        open(os.path.join(tmpdir, 'empty.bin'), 'wb').close()
+        assert list(edid.iter_edid_file(os.path.join(tmpdir, 'empty.bin'))) == []
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+CODEC_MODES = ((1920, 1080, 60000, False, 4), (1280, 720, 60000, False, 4), (720, 240, 60000, True, 4),
+               (720, 288, 50000, False, 1), (320, 240, 60000, False, 2), (1024, 768, 75000, False, 3))
+
+
+def test_hdmi_timings_round_trip():
+    for args in CODEC_MODES:
+        detres = crttimings.detailed_resolution_for(*args)
+        line = formats.hdmi_timings_text(detres)
+        record = formats.parse_timing_line(line)
+        expected = detres.as_record()
+        assert record[:9] == tuple(int(round(value)) for value in expected[:9]), (line, record)
+        assert record[9:12] == (bool(expected.h_polarity), bool(expected.v_polarity), bool(expected.interlaced))
+
+
+def test_iter_timing_records():
+    modes = [crttimings.detailed_resolution_for(*args) for args in CODEC_MODES]
+    text = '# custom modes\n\n' + ''.join(
+        formats.hdmi_timings_text(detres) + '\n' + formats.modeline_text(detres) + '\n' for detres in modes)
+    records = list(formats.iter_timing_records(io.StringIO(text)))
+    assert len(records) == 2 * len(modes)
+    assert records[0::2] == records[1::2]
+    resolutions = list(formats.iter_timing_resolutions(io.StringIO(text)))
+    assert [detres.as_record() for detres in resolutions] == records
+
+
+def test_strategies_leave_greedy_stall():
+    # the greedy steps stop short of 5 MHz on this mode, the moves do not
+    results = {}
+    for strategy in ('greedy', 'annealing', 'restart', 'tabu'):
+        detres = crttimings.detailed_resolution_for(320, 240, 60000, False, 2)
+        detres.set_timing(0)
+        search = opere.OpereTVResolution(pixel_clock=500, h_active=320, strategy=strategy, seed=1, max_steps=3000)
+        results[strategy] = search.call(detres)
+        assert search.effort.strategy == strategy and search.effort.reached == results[strategy]
+        if results[strategy]:
+            assert abs(detres.p_clock - 500) <= 500 * 0.02, (strategy, detres.p_clock)
+    assert results == {'greedy': False, 'annealing': True, 'restart': True, 'tabu': True}, results
+
+
+def test_unchanged_version_skips_goals():
+    detres = crttimings.detailed_resolution_for(640, 480, 60000, False, 1)
+    calls = []
+
+    def goal(obj):
+        calls.append(obj.version)
+        return -1
+
+    def step_nothing(obj):
+        pass
+
+    def step_h_front(obj):
+        obj.set_h_front(obj.h_front + 8)
+    search = Opere(max_steps=8, cycle_policy=None)
+    search.goals = [goal]
+    search.steps = [step_nothing]
+    assert not search.call(detres)
+    # evaluated once when the call starts, never after the steps
+    assert len(calls) == 1 and search.effort.goal_evaluations == 1
+    assert search.effort.skipped_evaluations == 9 and search.effort.steps == 8
+
+    del calls[:]
+    search.steps = [step_nothing, step_h_front]
+    assert not search.call(detres)
+    # only the states left by step_h_front are evaluated, each one once
+    assert len(calls) == len(set(calls)) == 5 and search.effort.goal_evaluations == 5
+    assert search.effort.skipped_evaluations == 5
+
+
+def test_adaptive_step_factors():
+    search = opere.OpereTVResolution(pixel_clock=960, adaptive=True, max_step_factor=8)
+    # pixel clock too high: porches shrink by a growing amount
+    search.goals_states[search.goal_pixel_clock] = 10
+    values = [search.next_value('h_back', 400, 8, 8) for _ in range(5)]
+    assert values == [392, 384, 368, 336, 336], values
+    assert search.step_factors['h_back'] == 8
+    # the goal sign flips: porches grow, by half the amount
+    search.goals_states[search.goal_pixel_clock] = -10
+    assert search.next_value('h_back', 336, 8, 8) == 336 + 8 * 4
+    assert search.next_value('h_back', 368, 8, 8) == 368 + 8 * 8
+    # floors hold whatever the factor
+    search.goals_states[search.goal_pixel_clock] = 10
+    assert search.next_value('h_back', 40, 8, 8) == 8
+    # shrink_steps halves the factors until they are all 1
+    search.step_factors = {'h_back': 4, 'v_back': 1}
+    assert search.shrink_steps() and search.step_factors == {'h_back': 2, 'v_back': 1}
+    assert search.shrink_steps() and search.step_factors == {'h_back': 1, 'v_back': 1}
+    assert not search.shrink_steps()
+    # without adaptive steps the amount stays one grid unit
+    fixed = opere.OpereTVResolution(pixel_clock=960)
+    fixed.goals_states[fixed.goal_pixel_clock] = 10
+    assert [fixed.next_value('h_back', 400, 8, 8) for _ in range(3)] == [392] * 3
+
+
+def test_cycle_detection_with_observers():
+    detres = crttimings.detailed_resolution_for(640, 480, 60000, False, 1)
+    changes = []
+    detres.subscribe(lambda obj, changed: changes.append(changed))
+
+    def step_wider(obj):
+        obj.set_h_front(obj.h_front + 8)
+
+    def step_narrower(obj):
+        obj.set_h_front(obj.h_front - 8)
+    search = Opere(max_steps=50, cycle_policy='stop')
+    search.state_fields = crttimings.PORCHES
+    search.goals = [lambda obj: -1]
+    search.steps = [step_wider, step_narrower]
+    h_front = detres.h_front
+    assert not search.call(detres)
+    # the second step undoes the first one: a cycle, and the search stops
+    assert search.effort.cycles == 1 and search.effort.steps == 2
+    assert detres.h_front == h_front and changes
+
+    # the same timing gives the same key, whether its mirror was computed
+    other = crttimings.detailed_resolution_for(640, 480, 60000, False, 1)
+    other.interlaced_view()
+    assert search.state_key(other) == search.state_key(detres)
+    tv = opere.OpereTVResolution()
+    assert tv.state_key(other) == tv.state_key(detres)
+
+
+def test_interlaced_round_trip_keeps_rate():
+    detres = crttimings.detailed_resolution_for(720, 480, 60000, False, 4)
+    detres.set_timing(0)
+    detres.set_v_rate(25000)
+    detres.set_interlaced(True)
+    assert detres.v_rate == 50000 and detres.v_rate_i == 25000
+    detres.set_v_back(detres.v_back + 1)
+    assert detres.v_rate_i == 25000
+    detres.set_interlaced(False)
+    assert detres.v_rate == 25000, detres.v_rate
+    # a rate change outdates the mirror rate
+    detres.set_v_rate(30000)
+    assert detres.v_rate_i == 60000
+
+
+def test_interlaced_toggle_is_a_swap():
+    for timing in (0, 4):
+        detres = crttimings.detailed_resolution_for(720, 480, 60000, False, 4)
+        detres.set_timing(timing)
+        detres.set_interlaced(True)
+        interlaced = detres.snapshot()
+        detres.set_interlaced(False)
+        progressive = detres.snapshot()
+        update = detres.update
+        detres.update = None
+        try:
+            for _ in range(3):
+                detres.set_interlaced(True)
+                assert detres.snapshot() == interlaced, timing
+                detres.set_interlaced(False)
+                assert detres.snapshot() == progressive, timing
+        finally:
+            detres.update = update
+
+
+def test_rate_index_matches_scan():
+    grid = ((320, 640, 720), (240, 288, 480), (50000, 60000), (False, True))
+    for monitor in (None, '15khz-tv'):
+        index = rateindex.build_rate_index(*grid, monitor=monitor)
+        profile = monitors.get_profile(monitor)
+        modes = []
+        for point in itertools.product(*grid):
+            mode = rateindex.compute_indexed_mode(*point)
+            if mode is None:
+                continue
+            if profile is not None and not monitors.admits(profile, mode.actual_h_rate, mode.actual_v_rate,
+                                                           mode.p_clock):
+                continue
+            modes.append(rateindex.IndexedMode(*[type(value)(int(value)) for value in mode]))
+        assert len(index) == len(modes) and modes
+        for windows in ({}, {'actual_h_rate': (15000, 16000)}, {'actual_v_rate': (49000, 51000)},
+                        {'actual_h_rate': (15000, 32000), 'p_clock': (600, 1400)},
+                        {'actual_h_rate': (15000, 32000), 'actual_v_rate': (59000, 61000), 'p_clock': (0, 1000)},
+                        {'p_clock': (2000, 1000)}):
+            expected = [mode for mode in modes
+                        if all(low <= getattr(mode, key) <= high for key, (low, high) in windows.items())]
+            assert sorted(index.query(**windows)) == sorted(expected), (monitor, windows)
+
+
+def test_monitor_limits_validity():
+    checks = ('is_valid_h_rate', 'is_valid_actual_h_rate', 'is_valid_actual_v_rate', 'is_valid_p_clock')
+    for args, expected in (((320, 240, 60000, False, 2), (True, True, True, True)),
+                           ((640, 480, 60000, False, 4), (False, False, True, False)),
+                           ((320, 240, 60000, False, 4), (False, False, True, True)),
+                           ((320, 200, 70000, False, 2), (True, True, False, True))):
+        detres = crttimings.detailed_resolution_for(*args)
+        assert all(getattr(detres, check)() for check in checks), args
+        detres.set_monitor('15khz-tv')
+        assert tuple(getattr(detres, check)() for check in checks) == expected, args
+        detres.set_monitor(None)
+        assert all(getattr(detres, check)() for check in checks), args
+
+
+def test_rpi_clock_limits():
+    pi3, pi4 = rpi.BOARDS['pi0-3'], rpi.BOARDS['pi4']
+    # exact multipliers: 12 MHz * 50 = 19.2 MHz * 31.25, 27 MHz * 23 = 54 MHz * 11.5
+    assert rpi.pll_divider(pi3, 1200) == 50 and rpi.is_achievable(pi3, 1200)
+    assert rpi.pll_divider(pi4, 2700) == 23 and rpi.is_achievable(pi4, 2700)
+    # 161.84 MHz * 4 is 8.75 kHz (pixel clock) away from the 75 kHz VCO steps
+    assert rpi.pll_divider(pi3, 16184) == 4 and not rpi.is_achievable(pi3, 16184)
+    # 154.96 MHz * 4 is 26.3 kHz away from the 210.9 kHz VCO steps
+    assert rpi.pll_divider(pi4, 15496) == 4 and not rpi.is_achievable(pi4, 15496)
+    # 2 MHz needs a divider over 255 to bring the VCO over 600 MHz
+    assert rpi.pll_divider(pi3, 200) is None and not rpi.is_achievable(pi3, 200)
+    for board in (pi3, pi4):
+        table = rpi.ClockTable.for_board(board.name)
+        assert 0 < len(table) < board.max_clock - board.min_clock + 1
+        assert list(table.clocks) == [clock for clock in range(board.min_clock, board.max_clock + 1)
+                                      if rpi.is_achievable(board, clock)]
+    table = rpi.ClockTable.for_board('pi4')
+    assert 15496 not in table and table.snap(15496) == 15488
+
+
+def test_jsonl_round_trip():
+    modes = [crttimings.detailed_resolution_for(*args) for args in CODEC_MODES]
+    stream = io.StringIO()
+    assert jsonl.dump(modes, stream, batch_size=4) == len(modes)
+    stream.seek(0)
+    assert list(jsonl.iter_load_snapshots(stream)) == [detres.snapshot() for detres in modes]
+    stream.seek(0)
+    assert [detres._as_dict() for detres in jsonl.iter_load(stream)] == [detres._as_dict() for detres in modes]
+
+
+def test_columns_round_trip():
+    modes = [crttimings.detailed_resolution_for(*args) for args in CODEC_MODES]
+    directory = tempfile.mkdtemp()
+    try:
+        assert columns.dump_columns(modes, directory, chunk_size=4) == len(modes)
+        loaded = columns.load_columns(directory)
+        for field in crttimings.FIELDS:
+            column = [bool(value) if field in columns.BOOL_FIELDS else int(value) for value in loaded[field]]
+            assert column == [int(getattr(detres, field)) if field not in columns.BOOL_FIELDS
+                              else bool(getattr(detres, field)) for detres in modes], field
+        del loaded
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_feasible_ranges_hold_solutions():
+    fields = intervals.RANGE_FIELDS
+    for args in CODEC_MODES:
+        detres = crttimings.detailed_resolution_for(*args)
+        values = dict((field, int(round(getattr(detres, field)))) for field in fields)
+        ranges = intervals.resolution_ranges(
+            detres, p_clock=(values['p_clock'], values['p_clock']))
+        assert ranges is not None, args
+        for field in fields:
+            low, high = ranges[field]
+            assert low <= values[field] <= high, (args, field, values[field], ranges[field])
+    assert intervals.feasible_ranges({'h_active': 1920, 'v_active': 1080}, p_clock=(100, 200),
+                                     actual_v_rate=(59000, 61000)) is None
+
+
+def test_search_feasible_ranges_hold_rate():
+    detres = crttimings.detailed_resolution_for(600, 240, 60000, False, 4)
+    detres.set_timing(0)
+    # 8 MHz at 60 Hz leaves less than 600 pixels a line
+    search = opere.OpereTVResolution(pixel_clock=800, h_active=600)
+    assert search.feasible_ranges(detres) is None
+    assert not search.call(detres) and search.effort.steps == 0
+    search = opere.OpereTVResolution(pixel_clock=1280, h_active=600)
+    low, high = search.feasible_ranges(detres)['actual_v_rate']
+    assert 58800 <= low <= 60000 <= high <= 61200
+    # holding h_rate instead: 8 MHz at 15.7 kHz leaves 509 pixels a line
+    detres.set_h_rate(15700)
+    search = opere.OpereTVResolution(pixel_clock=800, h_active=600)
+    assert search.feasible_ranges(detres) is None
+    detres.set_h_rate(12500)
+    assert search.feasible_ranges(detres) is not None
+
+
+def test_strategies_reach_pixel_clock():
+    for strategy in ('greedy', 'newton'):
+        detres = crttimings.detailed_resolution_for(600, 240, 60000, False, 4)
+        detres.set_timing(0)
+        search = opere.OpereTVResolution(pixel_clock=1280, h_active=600, strategy=strategy)
+        assert search.call(detres), strategy
+        assert search.effort.reached and abs(detres.p_clock - 1280) <= 1280 * 0.02, (strategy, detres.p_clock)
+
+
+class RecordingInterface(crttimings.DetailedResolutionInterface):
+    def __init__(self, debounce):
+        super(RecordingInterface, self).__init__(debounce)
+        self.renders = []
+
+    def render(self, changes):
+        self.renders.append(changes)
+
+
+def test_observers():
+    detres = crttimings.detailed_resolution_for(640, 240, 60000)
+    seen = []
+    detres.subscribe(lambda changed, changes: seen.append(changes))
+    detres.set_h_front(24)
+    assert seen[-1]['h_front'][1] == 24 and 'h_total' in seen[-1]
+    with detres.batch():
+        for h_front in range(32, 80, 8):
+            detres.set_h_front(h_front)
+        detres.set_v_back(20)
+    assert len(seen) == 2 and seen[-1]['h_front'] == (24, 72) and 'v_back' in seen[-1]
+    interface = RecordingInterface(3600)
+    interface.connect(detres)
+    for h_front in range(80, 160, 8):
+        detres.set_h_front(h_front)
+    assert len(interface.renders) == 1
+    interface.flush()
+    assert len(interface.renders) == 2 and interface.renders[-1]['h_front'] == (80, 152)
+    detres.calculate_all_timings()
+    assert len(seen) == 2 + 10
+
+
+def test_observers_follow_reverted_moves():
+    for strategy in ('annealing', 'tabu', 'restart'):
+        detres = crttimings.detailed_resolution_for(320, 240, 60000, False, 2)
+        detres.set_timing(0)
+        interface = RecordingInterface(0)
+        interface.connect(detres)
+        seen = detres.snapshot()._asdict()
+        search = opere.OpereTVResolution(pixel_clock=500, h_active=320, strategy=strategy, seed=1, max_steps=3000)
+        assert search.call(detres), strategy
+        assert interface.renders, strategy
+        for changes in interface.renders:
+            for field, (old, new) in changes.items():
+                assert seen[field] == old, (strategy, field)
+                seen[field] = new
+        assert seen == detres.snapshot()._asdict(), strategy
+
+
+def test_timing_standard_registry():
+    standards = crttimings.TIMING_STANDARDS
+    assert [standard.timing for standard in standards] == list(range(len(standards)))
+    assert len(standards.functions) == len(standards.texts) == len(standards)
+    assert standards.get('crt-standard').timing == 4
+    assert standards.functions[0] is None
+    detres = crttimings.detailed_resolution_for(640, 480, 60000, False, 4)
+    assert detres.get_timing_text(4) == 'Automatic - CRT standard' and detres.get_timing_text(len(standards)) is None
+    detres.timing = len(standards)
+    assert not detres.is_valid_timing()
+    results = detres.calculate_all_timings()
+    assert [result.timing for result in results] == [standard.timing for standard in standards.automatic()]
+    try:
+        crttimings.register_timing_standard('crt-standard', 'Duplicate', None)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("standard names are unique")
+    registry = crttimings.TimingRegistry()
+    standard = registry.register('custom', 'Custom', crttimings.DetailedResolution.calculate_crt_standard)
+    assert standard.timing == 0 and len(registry) == 1 and registry.automatic() == (standard,)
+
+
+def test_warm_start():
+    session = opere.SolvedModes()
+    steps = []
+    for h_active in range(256, 401, 16):
+        detres = crttimings.detailed_resolution_for(h_active, 240, 60000, False, 4)
+        detres.set_timing(0)
+        search = opere.OpereTVResolution(pixel_clock=h_active * 2, h_active=h_active, session=session)
+        assert search.call(detres), h_active
+        steps.append(search.effort.steps)
+    assert len(session) == len(steps)
+    assert max(steps[1:]) <= 4, steps
+
+
+for name, test in sorted(globals().items()):
+    if name.startswith('test_') and callable(test):
+        test()
+        print("{} ok".format(name))